@@ -11,10 +11,21 @@ from typing import Optional
 from datetime import datetime
 import json
 import uuid
+import hmac
+import hashlib
+import asyncio
 import os
+import re
+import time
+from collections import OrderedDict
 import base64
 import httpx
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 app = FastAPI(title="WhatsApp Automation API")
 
 app.add_middleware(
@@ -29,11 +40,69 @@ app.add_middleware(
 GITHUB_TOKEN = os.environ.get("GITHUB_TOKEN", "")
 GITHUB_REPO = os.environ.get("GITHUB_REPO", "srijanmishra08/automation")  # Your repo
 TARGET_REPO = os.environ.get("TARGET_REPO", "")  # The landing page repo to modify
+REPO_INDEX_TTL = float(os.environ.get("REPO_INDEX_TTL", 300))  # seconds before revalidating a file listing
+GITHUB_WEBHOOK_SECRET = os.environ.get("GITHUB_WEBHOOK_SECRET", "")  # secret set on the GitHub push webhook
+JSON_CODEC = os.environ.get("JSON_CODEC", "pretty")  # pretty / compact / orjson
+
+# HTTP/2 needs the optional h2 package (pip install "httpx[http2]")
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Shared keep-alive client, reused across requests while the function is warm
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the process-wide GitHub client, creating it on first use"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=10.0,
+            limits=httpx.Limits(max_connections=5, max_keepalive_connections=5)
+        )
+    return _http_client
+
+
+@app.on_event("shutdown")
+async def close_http_client():
+    if _http_client is not None:
+        await _http_client.aclose()
+
 
 # In-memory storage (resets on cold start)
 tasks_store = {}
 messages_store = []
 
+# TwiML responses by MessageSid so Twilio retries don't create duplicate tasks
+WEBHOOK_DEDUP_TTL = 600
+WEBHOOK_DEDUP_SIZE = 1000
+webhook_responses: OrderedDict[str, tuple[float, str]] = OrderedDict()
+# MessageSids still being handled; a retry waits for the first attempt's TwiML
+webhook_in_flight: dict[str, asyncio.Future] = {}
+
+
+def get_cached_response(message_sid: Optional[str]) -> Optional[str]:
+    """Return the stored TwiML for a MessageSid that was already handled"""
+    if not message_sid:
+        return None
+    entry = webhook_responses.get(message_sid)
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+    webhook_responses.pop(message_sid, None)
+    return None
+
+
+def cache_response(message_sid: Optional[str], twiml: str):
+    if not message_sid:
+        return
+    webhook_responses[message_sid] = (time.monotonic() + WEBHOOK_DEDUP_TTL, twiml)
+    while len(webhook_responses) > WEBHOOK_DEDUP_SIZE:
+        webhook_responses.popitem(last=False)
+
 
 class TaskRequest(BaseModel):
     type: str
@@ -43,6 +112,164 @@ class TaskRequest(BaseModel):
     auto_commit: bool = True
 
 
+def encode_task(task: dict) -> bytes:
+    """Encode a task file with the configured JSON codec"""
+    if JSON_CODEC == "orjson" and orjson is not None:
+        return orjson.dumps(task)
+    if JSON_CODEC in ("compact", "orjson"):
+        return json.dumps(task, separators=(",", ":")).encode()
+    return json.dumps(task, indent=2).encode()
+
+
+# Task type keywords in priority order
+TASK_TYPE_KEYWORDS = {
+    "copy_change": ["change", "update", "modify", "text", "copy", "title", "heading"],
+    "style_change": ["color", "background", "style", "font", "size"],
+    "component_add": ["add", "create", "new"],
+    "component_remove": ["remove", "delete", "hide"],
+}
+
+# Component keywords for React/Next.js projects, first match wins
+COMPONENT_MAP = {
+    "header": "app/components/Header.tsx",
+    "footer": "app/components/Footer.tsx",
+    "nav": "app/components/Navbar.tsx",
+    "navbar": "app/components/Navbar.tsx",
+    "hero": "app/components/Hero.tsx",
+    "cta": "app/components/CTA.tsx",
+    "button": "app/components/Button.tsx",
+    "form": "app/components/ContactForm.tsx",
+    "pricing": "app/components/Pricing.tsx",
+    "features": "app/components/Features.tsx",
+}
+
+TARGET_REPO_RE = re.compile(r'\bin\s+([a-zA-Z0-9_-]+)\s*$', re.IGNORECASE)
+
+# Reverse of COMPONENT_MAP: guessed path -> the keywords that produce it
+COMPONENT_KEYWORDS: dict[str, list[str]] = {}
+for _keyword, _path in COMPONENT_MAP.items():
+    COMPONENT_KEYWORDS.setdefault(_path, []).append(_keyword)
+
+# Files worth indexing in the target repo, most likely edit target first
+SOURCE_EXTENSIONS = (".tsx", ".jsx", ".ts", ".js", ".vue", ".svelte", ".astro", ".html", ".css", ".scss")
+IGNORED_DIRS = {"node_modules", ".next", "dist", "build", "out", "coverage"}
+GENERIC_STEMS = {"index", "page", "route", "main"}
+
+# File listings of target repos: repo -> {"checked", "etag", "paths", "names"}
+repo_indexes: dict[str, dict] = {}
+
+
+def index_repo_paths(paths: list[str]) -> dict[str, list[str]]:
+    """Lowercased component name -> paths, named after the directory for index/page files"""
+    names: dict[str, list[str]] = {}
+    for path in paths:
+        parts = path.split("/")
+        stem = parts[-1].split(".")[0]
+        if stem.lower() in GENERIC_STEMS and len(parts) > 1:
+            stem = parts[-2]
+        names.setdefault(stem.lower(), []).append(path)
+    return names
+
+
+async def get_repo_index(repo: str) -> Optional[dict]:
+    """
+    File listing of a repo's default branch from the git trees API
+    Revalidated with ETag after REPO_INDEX_TTL; a 304 doesn't count against the rate limit
+    """
+    entry = repo_indexes.get(repo)
+    now = time.monotonic()
+    if entry and now - entry["checked"] < REPO_INDEX_TTL:
+        return entry
+    
+    headers = {"Accept": "application/vnd.github.v3+json", "X-GitHub-Api-Version": "2022-11-28"}
+    if GITHUB_TOKEN:
+        headers["Authorization"] = f"Bearer {GITHUB_TOKEN}"
+    if entry:
+        headers["If-None-Match"] = entry["etag"]
+    
+    try:
+        resp = await get_http_client().get(
+            f"https://api.github.com/repos/{repo}/git/trees/HEAD",
+            params={"recursive": "1"},
+            headers=headers
+        )
+    except httpx.HTTPError:
+        return entry
+    
+    if resp.status_code == 304 and entry:
+        entry["checked"] = now
+        return entry
+    if resp.status_code != 200:
+        return entry
+    
+    paths = [
+        item["path"]
+        for item in resp.json().get("tree", [])
+        if item["type"] == "blob"
+        and item["path"].endswith(SOURCE_EXTENSIONS)
+        and not IGNORED_DIRS.intersection(item["path"].split("/")[:-1])
+    ]
+    entry = {
+        "checked": now,
+        "etag": resp.headers.get("etag", ""),
+        "paths": set(paths),
+        "names": index_repo_paths(paths),
+    }
+    repo_indexes[repo] = entry
+    return entry
+
+
+def rank_path(path: str) -> tuple:
+    parts = path.split("/")
+    ext = "." + parts[-1].rsplit(".", 1)[-1]
+    rank = SOURCE_EXTENSIONS.index(ext) if ext in SOURCE_EXTENSIONS else len(SOURCE_EXTENSIONS)
+    return ("components" not in parts, rank, len(parts), path)
+
+
+def lookup_component(index: dict, keywords: list[str]) -> Optional[str]:
+    """Best existing file named after one of the keywords: exact names first, then prefixes"""
+    for keyword in keywords:
+        exact = index["names"].get(keyword)
+        if exact:
+            return min(exact, key=rank_path)
+    
+    prefixed = [
+        path
+        for keyword in keywords if len(keyword) >= 3
+        for name, paths in index["names"].items() if name.startswith(keyword)
+        for path in paths
+    ]
+    return min(prefixed, key=rank_path) if prefixed else None
+
+
+async def resolve_scope(intent: dict) -> list[str]:
+    """
+    Replace guessed scope paths with files that exist in the target repo
+    Leaves the scope alone if the repo can't be listed
+    """
+    repo = intent.get("target_repo") or TARGET_REPO
+    if not repo:
+        return intent["scope"]
+    if "/" not in repo:
+        repo = f"{GITHUB_REPO.split('/')[0]}/{repo}"
+    
+    index = await get_repo_index(repo)
+    if not index:
+        return intent["scope"]
+    
+    scope = []
+    for path in intent["scope"]:
+        if path in index["paths"]:
+            scope.append(path)
+            continue
+        stem = path.rsplit("/", 1)[-1].split(".")[0].lower()
+        found = lookup_component(index, [stem, *COMPONENT_KEYWORDS.get(path, [])])
+        if found:
+            scope.append(found)
+    
+    return list(dict.fromkeys(scope)) or intent["scope"]
+
+
 async def write_task_to_github(task: dict) -> tuple[bool, str]:
     """Write task file to GitHub repo. Returns (success, error_message)"""
     if not GITHUB_TOKEN:
@@ -51,8 +278,7 @@ async def write_task_to_github(task: dict) -> tuple[bool, str]:
     try:
         repo = GITHUB_REPO
         file_path = f"tasks/CHANGE-{task['id']}.json"
-        content = json.dumps(task, indent=2)
-        content_b64 = base64.b64encode(content.encode()).decode()
+        content_b64 = base64.b64encode(encode_task(task)).decode()
         
         url = f"https://api.github.com/repos/{repo}/contents/{file_path}"
         headers = {
@@ -67,12 +293,11 @@ async def write_task_to_github(task: dict) -> tuple[bool, str]:
             "branch": "main"
         }
         
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            resp = await client.put(url, headers=headers, json=data)
-            if resp.status_code in [200, 201]:
-                return True, "Success"
-            else:
-                return False, f"GitHub API error {resp.status_code}: {resp.text[:200]}"
+        resp = await get_http_client().put(url, headers=headers, json=data)
+        if resp.status_code in [200, 201]:
+            return True, "Success"
+        else:
+            return False, f"GitHub API error {resp.status_code}: {resp.text[:200]}"
     except Exception as e:
         return False, f"Exception: {str(e)}"
 
@@ -92,25 +317,18 @@ def parse_intent(message: str) -> dict:
     - "update footer in my-repo"
     - "modify navbar color to blue"
     """
-    import re
     msg = message.lower()
     original_msg = message
     
     # Detect task type
-    if any(w in msg for w in ["change", "update", "modify", "text", "copy", "title", "heading"]):
-        task_type = "copy_change"
-    elif any(w in msg for w in ["color", "background", "style", "font", "size"]):
-        task_type = "style_change"
-    elif any(w in msg for w in ["add", "create", "new"]):
-        task_type = "component_add"
-    elif any(w in msg for w in ["remove", "delete", "hide"]):
-        task_type = "component_remove"
-    else:
-        task_type = "general_edit"
+    task_type = next(
+        (label for label, words in TASK_TYPE_KEYWORDS.items() if any(w in msg for w in words)),
+        "general_edit"
+    )
     
     # Detect target repo FIRST (pattern: "in repo-name" at the end)
     target_repo = None
-    repo_match = re.search(r'\bin\s+([a-zA-Z0-9_-]+)\s*$', original_msg, re.IGNORECASE)
+    repo_match = TARGET_REPO_RE.search(original_msg)
     if repo_match:
         target_repo = repo_match.group(1)
     
@@ -120,20 +338,7 @@ def parse_intent(message: str) -> dict:
     else:
         # Detect target component for React/Next.js projects
         scope = ["index.html"]  # default for simple sites
-        component_map = {
-            "header": "app/components/Header.tsx",
-            "footer": "app/components/Footer.tsx",
-            "nav": "app/components/Navbar.tsx",
-            "navbar": "app/components/Navbar.tsx",
-            "hero": "app/components/Hero.tsx",
-            "cta": "app/components/CTA.tsx",
-            "button": "app/components/Button.tsx",
-            "form": "app/components/ContactForm.tsx",
-            "pricing": "app/components/Pricing.tsx",
-            "features": "app/components/Features.tsx",
-        }
-        
-        for keyword, file_path in component_map.items():
+        for keyword, file_path in COMPONENT_MAP.items():
             if keyword in msg:
                 scope = [file_path]
                 break
@@ -178,8 +383,42 @@ def root():
 async def whatsapp_webhook(
     From: str = Form(default="unknown"),
     Body: str = Form(default=""),
+    MessageSid: Optional[str] = Form(default=None),
 ):
     """Twilio WhatsApp webhook"""
+    cached = get_cached_response(MessageSid)
+    if cached:
+        return Response(content=cached, media_type="application/xml")
+    
+    if not MessageSid:
+        twiml, _ = await handle_whatsapp_message(From, Body)
+        return Response(content=twiml, media_type="application/xml")
+    
+    in_flight = webhook_in_flight.get(MessageSid)
+    if in_flight is not None:
+        # shield: a retry disconnecting must not cancel the original work
+        return Response(content=await asyncio.shield(in_flight), media_type="application/xml")
+    
+    future = asyncio.get_running_loop().create_future()
+    webhook_in_flight[MessageSid] = future
+    try:
+        twiml, ok = await handle_whatsapp_message(From, Body)
+    except BaseException as e:
+        webhook_in_flight.pop(MessageSid, None)
+        future.set_exception(e)
+        future.exception()  # mark retrieved when nobody is waiting
+        raise
+    
+    # Errors go to this attempt and its waiting retries, but aren't cached
+    webhook_in_flight.pop(MessageSid, None)
+    if ok:
+        cache_response(MessageSid, twiml)
+    future.set_result(twiml)
+    return Response(content=twiml, media_type="application/xml")
+
+
+async def handle_whatsapp_message(From: str, Body: str) -> tuple[str, bool]:
+    """TwiML reply for one inbound message, and whether it may be cached"""
     try:
         from twilio.twiml.messaging_response import MessagingResponse
         
@@ -187,7 +426,7 @@ async def whatsapp_webhook(
         
         if not Body:
             response.message("Please send a message describing the change you want.")
-            return Response(content=str(response), media_type="application/xml")
+            return str(response), True
         
         # Store message
         messages_store.append({
@@ -198,6 +437,7 @@ async def whatsapp_webhook(
         
         # Parse and create task
         intent = parse_intent(Body)
+        intent["scope"] = await resolve_scope(intent)
         task_id = str(uuid.uuid4())[:8]
         
         task = {
@@ -224,12 +464,33 @@ async def whatsapp_webhook(
             f"📌 {github_status}"
         )
         
-        return Response(content=str(response), media_type="application/xml")
+        return str(response), True
         
     except Exception as e:
         # Return error as TwiML so Twilio doesn't retry
         error_xml = f'<Response><Message>Error: {str(e)[:100]}</Message></Response>'
-        return Response(content=error_xml, media_type="application/xml")
+        return error_xml, False
+
+
+def verify_github_signature(body: bytes, signature: str) -> bool:
+    """Check X-Hub-Signature-256 against GITHUB_WEBHOOK_SECRET; unsigned calls are refused"""
+    if not GITHUB_WEBHOOK_SECRET:
+        return False
+    expected = "sha256=" + hmac.new(GITHUB_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+@app.post("/webhook/github")
+async def github_webhook(request: Request):
+    """Push events drop the pushed repo's file listing so the next task re-reads it"""
+    body = await request.body()
+    if not verify_github_signature(body, request.headers.get("X-Hub-Signature-256", "")):
+        raise HTTPException(status_code=403, detail="Invalid signature")
+    
+    if request.headers.get("X-GitHub-Event") == "push":
+        payload = json.loads(body)
+        repo_indexes.pop(payload.get("repository", {}).get("full_name", ""), None)
+    return {"ok": True}
 
 
 @app.post("/tasks/create")
@@ -0,0 +1,168 @@
+"""
+Audio Preprocessor - Prepares voice notes for transcription
+Decodes to 16 kHz mono, trims leading/trailing silence and splits long audio into chunks
+"""
+
+import io
+import os
+import sys
+import array
+import wave
+import shutil
+import asyncio
+from typing import BinaryIO, Optional
+
+SAMPLE_RATE = 16000
+BYTES_PER_SAMPLE = 2  # s16le
+
+# Bytes of the spooled note handed to ffmpeg per write
+FEED_BYTES = 64 * 1024
+
+# Energy-based VAD in ffmpeg: drop silence at the start, reverse, drop again, reverse back
+TRIM_FILTER = (
+    "silenceremove=start_periods=1:start_duration=0.1:start_threshold={threshold}dB,"
+    "areverse,"
+    "silenceremove=start_periods=1:start_duration=0.1:start_threshold={threshold}dB,"
+    "areverse"
+)
+
+
+class AudioPreprocessor:
+    """
+    Runs ffmpeg to produce trimmed 16 kHz mono PCM, then cuts it into chunks
+    Chunk boundaries are moved to the quietest point near the limit to avoid splitting words
+
+    Chunks are views into the decoded PCM; callers encode each one with
+    to_wav() when they need it, so only the chunks in flight exist as WAV.
+    """
+
+    def __init__(
+        self,
+        chunk_seconds: float = 60,
+        search_seconds: float = 2,
+        silence_threshold_db: int = -45,
+        ffmpeg_path: str = None
+    ):
+        self.chunk_samples = int(chunk_seconds * SAMPLE_RATE)
+        self.search_samples = int(search_seconds * SAMPLE_RATE)
+        self.silence_threshold_db = silence_threshold_db
+        self.ffmpeg_path = ffmpeg_path or shutil.which("ffmpeg")
+
+    @property
+    def available(self) -> bool:
+        return self.ffmpeg_path is not None
+
+    async def process(self, audio_file: BinaryIO) -> Optional[list[memoryview]]:
+        """
+        Return sample chunks in playback order, or None if decoding failed
+        An empty list means the note was entirely silence
+        """
+        pcm = await self._decode(audio_file)
+        if pcm is None:
+            return None
+
+        # Scanning for cut points is pure Python; keep it off the event loop
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._split_pcm, pcm)
+
+    async def encode(self, chunk: memoryview) -> bytes:
+        """to_wav() run off the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.to_wav, chunk)
+
+    def _split_pcm(self, pcm: bytes) -> list[memoryview]:
+        samples = memoryview(pcm)[:len(pcm) - len(pcm) % BYTES_PER_SAMPLE].cast("h")
+        if sys.byteorder == "big":
+            swapped = array.array("h", samples)
+            swapped.byteswap()
+            samples = memoryview(swapped)
+        return self.split(samples)
+
+    def split(self, samples: memoryview) -> list[memoryview]:
+        """Cut samples into chunks of at most chunk_samples"""
+        chunks = []
+        start = 0
+        while len(samples) - start > self.chunk_samples:
+            end = self._quietest_cut(samples, start + self.chunk_samples)
+            chunks.append(samples[start:end])
+            start = end
+        if len(samples) > start:
+            chunks.append(samples[start:])
+        return chunks
+
+    def _quietest_cut(self, samples: memoryview, limit: int) -> int:
+        """Lowest-energy 20 ms frame in the search window before limit"""
+        frame = SAMPLE_RATE // 50
+        best_end, best_energy = limit, None
+        window_start = max(limit - self.search_samples, frame)
+        for end in range(limit, window_start, -frame):
+            energy = sum(abs(s) for s in samples[end - frame:end])
+            if best_energy is None or energy < best_energy:
+                best_end, best_energy = end, energy
+        return best_end
+
+    async def _decode(self, audio_file: BinaryIO) -> Optional[bytes]:
+        """
+        Decode any ffmpeg-supported input to trimmed s16le 16 kHz mono PCM
+        The note is fed to ffmpeg in FEED_BYTES pieces rather than read whole
+        """
+        process = await asyncio.create_subprocess_exec(
+            self.ffmpeg_path,
+            "-hide_banner", "-loglevel", "error",
+            "-i", "pipe:0",
+            "-af", TRIM_FILTER.format(threshold=self.silence_threshold_db),
+            "-ac", "1",
+            "-ar", str(SAMPLE_RATE),
+            "-f", "s16le",
+            "pipe:1",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+
+        async def feed():
+            try:
+                while chunk := audio_file.read(FEED_BYTES):
+                    process.stdin.write(chunk)
+                    await process.stdin.drain()
+                process.stdin.close()
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # ffmpeg gave up early; its exit code says why
+
+        _, pcm, error = await asyncio.gather(feed(), process.stdout.read(), process.stderr.read())
+        await process.wait()
+        if process.returncode != 0:
+            print(f"ffmpeg failed: {error.decode(errors='replace').strip()}")
+            return None
+        return pcm
+
+    @staticmethod
+    def to_wav(samples: memoryview) -> bytes:
+        """Little-endian 16 kHz mono WAV of a chunk"""
+        if sys.byteorder == "big":
+            samples = array.array("h", samples)
+            samples.byteswap()
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(BYTES_PER_SAMPLE)
+            wav.setframerate(SAMPLE_RATE)
+            wav.writeframes(samples.tobytes())
+        return buffer.getvalue()
+
+
+def create_preprocessor() -> Optional[AudioPreprocessor]:
+    """
+    Build the preprocessor if AUDIO_PREPROCESS is enabled and ffmpeg is installed
+    """
+    if os.getenv("AUDIO_PREPROCESS", "true").lower() not in ("1", "true", "yes"):
+        return None
+
+    preprocessor = AudioPreprocessor(
+        chunk_seconds=float(os.getenv("AUDIO_CHUNK_SECONDS", 60)),
+        silence_threshold_db=int(os.getenv("AUDIO_SILENCE_THRESHOLD_DB", -45))
+    )
+    if not preprocessor.available:
+        print("Warning: ffmpeg not found. Voice notes are transcribed without preprocessing.")
+        return None
+    return preprocessor
@@ -0,0 +1,53 @@
+"""
+HTTP Clients - Process-wide pooled httpx clients for outbound calls
+One keep-alive client per upstream (OpenAI, Twilio, GitHub) instead of one per request
+"""
+
+import os
+import importlib.util
+import httpx
+
+# HTTP/2 needs the optional h2 package (pip install "httpx[http2]")
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# Per-host pool settings: (max_connections, max_keepalive_connections, timeout)
+CLIENT_SETTINGS = {
+    "openai": (int(os.getenv("OPENAI_MAX_CONNECTIONS", 20)), 10, 60.0),
+    "twilio": (int(os.getenv("TWILIO_MAX_CONNECTIONS", 10)), 5, 30.0),
+    "github": (int(os.getenv("GITHUB_MAX_CONNECTIONS", 5)), 5, 10.0),
+}
+
+
+class HTTPClientRegistry:
+    """
+    Lazily creates one AsyncClient per upstream and closes them all on shutdown
+    """
+    
+    def __init__(self, settings: dict = CLIENT_SETTINGS):
+        self.settings = settings
+        self._clients: dict[str, httpx.AsyncClient] = {}
+    
+    def get(self, name: str) -> httpx.AsyncClient:
+        """Return the shared client for an upstream, creating it on first use"""
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            max_connections, max_keepalive, timeout = self.settings[name]
+            client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                timeout=timeout,
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_keepalive
+                )
+            )
+            self._clients[name] = client
+        return client
+    
+    async def aclose(self):
+        """Close every pool, called on app shutdown"""
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+
+
+http_clients = HTTPClientRegistry()
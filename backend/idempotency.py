@@ -0,0 +1,63 @@
+"""
+Idempotency - Deduplicates Twilio webhook retries by MessageSid
+The first delivery does the work, retries get the same response back
+"""
+
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+
+class IdempotencyStore:
+    """
+    Bounded TTL map of key -> future holding the response
+    A retry that arrives while the first attempt is still running waits for it
+    """
+    
+    def __init__(self, ttl: float = 600, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self._entries: OrderedDict[str, tuple[float, asyncio.Future]] = OrderedDict()
+    
+    async def run(self, key: str, func: Callable[[], Awaitable[tuple[str, bool]]]) -> str:
+        """
+        Return the stored response for key, or run func once and store it
+        func returns (response, ok); a response with ok False still goes to
+        this caller and any waiting retries, but the next retry runs again
+        """
+        self._expire()
+        
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            # shield: a retry disconnecting must not cancel the original work
+            return await asyncio.shield(entry[1])
+        
+        future = asyncio.get_running_loop().create_future()
+        self._entries[key] = (time.monotonic() + self.ttl, future)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        
+        try:
+            result, ok = await func()
+        except BaseException as e:
+            # Failed attempts aren't cached, the next retry runs again
+            self._entries.pop(key, None)
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody is waiting
+            raise
+        
+        if not ok:
+            self._entries.pop(key, None)
+        future.set_result(result)
+        return result
+    
+    def _expire(self):
+        now = time.monotonic()
+        while self._entries:
+            key, (expires, future) = next(iter(self._entries.items()))
+            if expires > now or not future.done():
+                break
+            self._entries.popitem(last=False)
@@ -0,0 +1,189 @@
+"""
+Intent Cache - LRU + TTL cache for parsed intents
+Repeat requests like "change hero text to 'X'" skip the OpenAI round trip
+"""
+
+import re
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from io_pool import run_io
+
+# Quoted literals: "x", 'x', “x”, ‘x’ - apostrophes inside words don't count
+QUOTED_RE = re.compile(r"""(?<!\w)(?:"([^"]+)"|'([^']+)'|“([^”]+)”|‘([^’]+)’)(?!\w)""")
+WHITESPACE_RE = re.compile(r"\s+")
+
+# Placeholder written into cached intents in place of a literal
+PLACEHOLDER = "\x00{}\x00"
+
+# Disk tier puts between sweeps of expired and overflow rows
+DISK_PRUNE_EVERY = 100
+
+
+def normalize_message(message: str) -> tuple[str, list[str]]:
+    """
+    Split a message into a cache key and its quoted literals
+    The key is case-folded and whitespace-collapsed with literals replaced by slots
+    """
+    literals = []
+
+    def slot(match: re.Match) -> str:
+        literals.append(next(group for group in match.groups() if group is not None))
+        return f'"{{{len(literals) - 1}}}"'
+
+    key = QUOTED_RE.sub(slot, message.strip())
+    key = WHITESPACE_RE.sub(" ", key).casefold()
+    return key, literals
+
+
+class IntentCache:
+    """
+    In-memory LRU with per-entry TTL and an optional SQLite disk tier
+    Async callers use get_async/put_async so disk reads and commits stay off the event loop
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl: float = 3600,
+        disk_path: Optional[str] = None,
+        disk_max_entries: int = 10000
+    ):
+        self.max_entries = max_entries
+        self.disk_max_entries = disk_max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._disk = None
+        self._disk_puts = 0
+        if disk_path:
+            Path(disk_path).parent.mkdir(parents=True, exist_ok=True)
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+            self._disk.executescript("""
+                CREATE TABLE IF NOT EXISTS intents
+                    (key TEXT PRIMARY KEY, expires REAL NOT NULL, intent TEXT NOT NULL);
+                CREATE INDEX IF NOT EXISTS idx_intents_expires ON intents (expires);
+            """)
+            self._prune_disk()
+
+    def get(self, message: str) -> Optional[dict]:
+        """Return a cached intent for the message with its literals filled in"""
+        key, literals = normalize_message(message)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] <= now:
+                del self._entries[key]
+                entry = None
+
+            if entry is None and self._disk is not None:
+                entry = self._disk_get(key, now)
+                if entry:
+                    self._store(key, entry)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        intent = json.loads(entry[1])
+        for i, literal in enumerate(literals):
+            intent["description"] = intent["description"].replace(PLACEHOLDER.format(i), literal)
+        return intent
+
+    def put(self, message: str, intent: dict):
+        """
+        Cache an intent with the message's literals turned into slots
+
+        Only the description is parameterized. If a literal is missing from
+        it, or leaks into scope/rules, the intent can't be reused for other
+        literals and is not cached.
+        """
+        key, literals = normalize_message(message)
+        description = intent.get("description", "")
+        others = json.dumps({k: v for k, v in intent.items() if k != "description"})
+        if any(literal not in description or literal in others for literal in literals):
+            return
+
+        # Longest first so a literal containing another isn't split
+        for i, literal in sorted(enumerate(literals), key=lambda item: -len(item[1])):
+            description = description.replace(literal, PLACEHOLDER.format(i))
+
+        # Stored serialized so callers can't mutate cached entries
+        entry = (time.time() + self.ttl, json.dumps({**intent, "description": description}))
+
+        with self._lock:
+            self._store(key, entry)
+            if self._disk is not None:
+                with self._disk:
+                    self._disk.execute(
+                        "INSERT OR REPLACE INTO intents (key, expires, intent) VALUES (?, ?, ?)",
+                        (key, entry[0], entry[1])
+                    )
+                self._disk_puts += 1
+                if self._disk_puts % DISK_PRUNE_EVERY == 0:
+                    self._prune_disk()
+
+    async def get_async(self, message: str) -> Optional[dict]:
+        """
+        get() for async callers; run on the I/O pool when there's a disk tier
+        """
+        if self._disk is None:
+            return self.get(message)
+        return await run_io(self.get, message)
+
+    async def put_async(self, message: str, intent: dict):
+        """
+        put() for async callers; run on the I/O pool when there's a disk tier
+        """
+        if self._disk is None:
+            return self.put(message, intent)
+        return await run_io(self.put, message, intent)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+    def _store(self, key: str, entry: tuple[float, str]):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _prune_disk(self):
+        """Drop expired rows, then the soonest-expiring past disk_max_entries"""
+        with self._disk:
+            self._disk.execute("DELETE FROM intents WHERE expires <= ?", (time.time(),))
+            self._disk.execute(
+                "DELETE FROM intents WHERE key IN ("
+                "SELECT key FROM intents ORDER BY expires DESC LIMIT -1 OFFSET ?)",
+                (self.disk_max_entries,)
+            )
+
+    def _disk_get(self, key: str, now: float) -> Optional[tuple[float, str]]:
+        row = self._disk.execute(
+            "SELECT expires, intent FROM intents WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[0] <= now:
+            with self._disk:
+                self._disk.execute("DELETE FROM intents WHERE key = ?", (key,))
+            return None
+        return (row[0], row[1])
@@ -4,13 +4,34 @@ Uses OpenAI to understand user requests and map them to task types
 """
 
 import os
+import re
 import json
-from typing import Optional
+import asyncio
+from typing import AsyncIterator, Optional
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
 
+from http_clients import http_clients
+from intent_cache import IntentCache, normalize_message
+from scope_resolver import create_scope_resolver
+
 load_dotenv()
 
+# Output tokens budgeted per intent, and gpt-4o-mini's completion limit
+TOKENS_PER_INTENT = 500
+MAX_COMPLETION_TOKENS = 16384
+
+# Largest pack whose intents fit in one completion
+MAX_PACK_SIZE = MAX_COMPLETION_TOKENS // TOKENS_PER_INTENT
+
+# "replace Ad directors text with ..." / "change text 'X' to ..." - the existing text is the first group
+REPLACED_TEXT_RE = re.compile(
+    r"\b(?:replace|change|rename|update|remove|delete)\s+(?:the\s+)?"
+    r"(?:(?:text|copy|heading|title|label|line)\s+)?(.+?)\s+"
+    r"(?:(?:text|copy|heading|title|label|line)\s+)?(?:to|with|into|by|from)\b",
+    re.IGNORECASE
+)
+
 
 class IntentParser:
     """
@@ -28,7 +49,7 @@ class IntentParser:
         "remove_content": "Remove content from components"
     }
     
-    # Files that are commonly edited
+    # Files that are commonly edited; with a scope index these are hints, not answers
     COMMON_SCOPES = {
         "hero": ["app/components/Hero.tsx", "components/Hero.tsx", "src/components/Hero.tsx"],
         "header": ["app/components/Header.tsx", "components/Header.tsx", "src/components/Header.tsx"],
@@ -41,6 +62,22 @@ class IntentParser:
         "colors": ["tailwind.config.js", "tailwind.config.ts", "styles/globals.css"],
     }
     
+    # Rule-based type detection keywords, in priority order
+    TYPE_KEYWORDS = {
+        "copy_change": ["change text", "change button", "change cta", "rename", "update text", "modify text"],
+        "section_reorder": ["reorder", "move section", "swap"],
+        "color_change": ["color", "theme", "background"],
+        "seo_update": ["seo", "meta", "title tag", "description tag"],
+        "style_change": ["style", "css", "padding", "margin"],
+    }
+    
+    # Words that name a part of the page rather than copy on it ("hero button")
+    COMPONENT_WORDS = frozenset(COMMON_SCOPES) | {
+        "button", "section", "banner", "heading", "headline", "title", "subtitle",
+        "text", "copy", "label", "link", "menu", "navbar", "navigation", "page",
+        "tagline", "main", "top", "bottom", "our", "my",
+    }
+    
     SYSTEM_PROMPT = """You are an intent parser for a website change automation system.
     
 Your job is to analyze user messages and extract:
@@ -90,30 +127,142 @@ Set auto_commit to false for:
 - Anything that could break the site
 
 If the message is unclear or not a valid change request, set confidence below 0.5.
+"""
+    
+    BATCH_PROMPT_SUFFIX = """
+You will receive a JSON array of messages instead of a single message.
+Respond ONLY with a JSON object of the form {"intents": [...]} containing
+exactly one intent object (as described above) per message, in the same order.
 """
     
     def __init__(self):
         api_key = os.getenv("OPENAI_API_KEY")
         if api_key:
-            self.client = AsyncOpenAI(api_key=api_key)
+            self.client = AsyncOpenAI(api_key=api_key, http_client=http_clients.get("openai"))
         else:
             self.client = None
             print("Warning: OPENAI_API_KEY not set. Using rule-based parsing only.")
+        
+        # Cache model results for repeat / near-repeat messages
+        self.cache = IntentCache(
+            max_entries=int(os.getenv("INTENT_CACHE_SIZE", 1000)),
+            ttl=float(os.getenv("INTENT_CACHE_TTL", 3600)),
+            disk_path=os.getenv("INTENT_CACHE_PATH") or None,
+            disk_max_entries=int(os.getenv("INTENT_CACHE_DISK_SIZE", 10000))
+        )
+        
+        # Index of the target repo's files, if it's checked out locally
+        self.scopes = create_scope_resolver()
     
     async def parse(self, message: str) -> dict:
         """
         Parse a natural language message into a structured task intent
         """
+        return self._pin_scope(message, await self._parse(message))
+    
+    async def _parse(self, message: str) -> dict:
         # Try OpenAI first if available
         if self.client:
+            cached = await self.cache.get_async(message)
+            if cached:
+                return cached
+            
             try:
-                return await self._parse_with_openai(message)
+                intent = await self._parse_with_openai(message)
+                await self.cache.put_async(message, intent)
+                return intent
             except Exception as e:
                 print(f"OpenAI parsing failed: {e}")
         
         # Fallback to rule-based parsing
         return self._parse_with_rules(message)
     
+    async def parse_many(
+        self,
+        messages: list[str],
+        concurrency: int = None,
+        pack_size: int = 1
+    ) -> AsyncIterator[tuple[int, dict]]:
+        """
+        Parse many messages with bounded concurrency
+        Yields (index, intent) pairs as they complete, not in input order
+        
+        With pack_size > 1, up to pack_size uncached messages are sent to the
+        model in a single request that returns a JSON array of intents.
+        
+        Both knobs come from API callers, so they are clamped: concurrency to
+        INTENT_BATCH_CONCURRENCY and pack_size to MAX_PACK_SIZE.
+        """
+        max_concurrency = int(os.getenv("INTENT_BATCH_CONCURRENCY", 8))
+        concurrency = min(max(1, concurrency or max_concurrency), max_concurrency)
+        semaphore = asyncio.Semaphore(concurrency)
+        pack_size = min(max(1, pack_size), MAX_PACK_SIZE)
+        
+        async def run(indexes: list[int]) -> list[tuple[int, dict]]:
+            async with semaphore:
+                if len(indexes) == 1:
+                    return [(indexes[0], await self.parse(messages[indexes[0]]))]
+                intents = await self._parse_packed([messages[i] for i in indexes])
+                return list(zip(indexes, intents))
+        
+        tasks = [
+            asyncio.ensure_future(run(list(range(start, min(start + pack_size, len(messages))))))
+            for start in range(0, len(messages), pack_size)
+        ]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                for result in await finished:
+                    yield result
+        finally:
+            # Caller stopped early (e.g. client disconnected)
+            for task in tasks:
+                task.cancel()
+    
+    async def _parse_packed(self, messages: list[str]) -> list[dict]:
+        """
+        Parse a pack of messages with one model request
+        Cached messages are skipped; falls back to per-message parsing on failure
+        """
+        if self.client:
+            results = list(await asyncio.gather(*(self.cache.get_async(m) for m in messages)))
+        else:
+            results = [None] * len(messages)
+        pending = [i for i, intent in enumerate(results) if intent is None]
+        
+        if len(pending) > 1 and self.client:
+            try:
+                intents = await self._parse_batch_with_openai([messages[i] for i in pending])
+                for i, intent in zip(pending, intents):
+                    await self.cache.put_async(messages[i], intent)
+                    results[i] = intent
+                pending = []
+            except Exception as e:
+                print(f"OpenAI batch parsing failed: {e}")
+        
+        for i in pending:
+            results[i] = await self._parse(messages[i])
+        
+        return [self._pin_scope(message, intent) for message, intent in zip(messages, results)]
+    
+    async def _parse_batch_with_openai(self, messages: list[str]) -> list[dict]:
+        """Use one OpenAI request to parse several messages"""
+        response = await self.client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": self.SYSTEM_PROMPT + self.BATCH_PROMPT_SUFFIX},
+                {"role": "user", "content": json.dumps(messages)}
+            ],
+            response_format={"type": "json_object"},
+            temperature=0.1,
+            max_tokens=min(TOKENS_PER_INTENT * len(messages), MAX_COMPLETION_TOKENS)
+        )
+        
+        intents = json.loads(response.choices[0].message.content)["intents"]
+        if len(intents) != len(messages):
+            raise ValueError(f"expected {len(messages)} intents, got {len(intents)}")
+        
+        return [self._validate_intent(intent) for intent in intents]
+    
     async def _parse_with_openai(self, message: str) -> dict:
         """Use OpenAI to parse the intent"""
         response = await self.client.chat.completions.create(
@@ -123,23 +272,20 @@ If the message is unclear or not a valid change request, set confidence below 0.
                 {"role": "user", "content": message}
             ],
             temperature=0.1,
-            max_tokens=500
+            max_tokens=TOKENS_PER_INTENT
         )
         
         content = response.choices[0].message.content.strip()
         
-        # Parse JSON response
-        try:
-            # Remove markdown code blocks if present
-            if content.startswith("```"):
-                content = content.split("```")[1]
-                if content.startswith("json"):
-                    content = content[4:]
-            
-            intent = json.loads(content)
-            return self._validate_intent(intent)
-        except json.JSONDecodeError:
-            return self._parse_with_rules(message)
+        # Remove markdown code blocks if present
+        if content.startswith("```"):
+            content = content.split("```")[1]
+            if content.startswith("json"):
+                content = content[4:]
+        
+        # Not JSON: raise so _parse falls back to rules without caching the result
+        intent = json.loads(content)
+        return self._validate_intent(intent)
     
     def _parse_with_rules(self, message: str) -> dict:
         """
@@ -148,27 +294,19 @@ If the message is unclear or not a valid change request, set confidence below 0.
         message_lower = message.lower()
         
         # Detect task type
-        task_type = "component_edit"  # default
-        
-        if any(word in message_lower for word in ["change text", "change button", "change cta", "rename", "update text", "modify text"]):
-            task_type = "copy_change"
-        elif any(word in message_lower for word in ["reorder", "move section", "swap"]):
-            task_type = "section_reorder"
-        elif any(word in message_lower for word in ["color", "theme", "background"]):
-            task_type = "color_change"
-        elif any(word in message_lower for word in ["seo", "meta", "title tag", "description tag"]):
-            task_type = "seo_update"
-        elif any(word in message_lower for word in ["style", "css", "padding", "margin"]):
-            task_type = "style_change"
+        task_type = next(
+            (label for label, words in self.TYPE_KEYWORDS.items() if any(word in message_lower for word in words)),
+            "component_edit"
+        )
         
         # Detect scope
         scope = []
         for key, files in self.COMMON_SCOPES.items():
             if key in message_lower:
-                scope.extend(files[:1])  # Add first matching file
+                scope += self._resolve_scope(key)
         
         if not scope:
-            scope = ["app/components/Hero.tsx"]  # Default
+            scope = self._resolve_scope("hero") or ["app/components/Hero.tsx"]  # Default
         
         # Generate rules based on task type
         rules = self._generate_rules(task_type)
@@ -182,12 +320,54 @@ If the message is unclear or not a valid change request, set confidence below 0.
         return {
             "type": task_type,
             "description": message,
-            "scope": list(set(scope)),
+            "scope": list(dict.fromkeys(scope)),
             "rules": rules,
             "auto_commit": auto_commit,
             "confidence": confidence
         }
     
+    def _pin_scope(self, message: str, intent: dict) -> dict:
+        """
+        Narrow a copy_change's scope to the files and lines that contain text the
+        message quotes or asks to replace. Runs after caching, since the hits
+        depend on the literal.
+        """
+        text_index = self.scopes.text_index if self.scopes else None
+        if text_index is None or intent.get("type") != "copy_change":
+            return intent
+        
+        # Only the text being replaced is in the repo, never the new text after "to"
+        _, literals = normalize_message(message)
+        match = REPLACED_TEXT_RE.search(message)
+        quoted = [literal for literal in literals if match and literal in match.group(1)]
+        if quoted:
+            # "change hero text 'X' to ..." - the quote is the copy, the rest names a place
+            phrase = quoted[0]
+        elif match:
+            phrase = match.group(1).strip(" \"'“”‘’")
+            # Unquoted component words ("change hero button to ...") name a place, not copy
+            words = phrase.lower().split()
+            if len(words) < 2 or self.COMPONENT_WORDS.issuperset(words):
+                return intent
+        elif literals:
+            phrase = literals[0]
+        else:
+            return intent
+        
+        locations = text_index.find(phrase)
+        if locations:
+            intent["scope"] = list(dict.fromkeys(location["file"] for location in locations))
+            intent["locations"] = locations
+        
+        return intent
+    
+    def _resolve_scope(self, key: str) -> list[str]:
+        """Best existing file for a scope keyword, or the first guess without an index"""
+        hints = self.COMMON_SCOPES.get(key, [])
+        if self.scopes:
+            return self.scopes.resolve(key, hints=hints, limit=1)
+        return hints[:1]
+    
     def _generate_rules(self, task_type: str) -> list[str]:
         """Generate safety rules based on task type"""
         base_rules = [
@@ -235,8 +415,14 @@ If the message is unclear or not a valid change request, set confidence below 0.
         if "description" not in intent:
             intent["description"] = "No description provided"
         
+        # The model guesses paths; swap them for files that actually exist
+        if self.scopes and intent.get("scope"):
+            intent["scope"] = list(dict.fromkeys(
+                path for path in map(self.scopes.resolve_path, intent["scope"]) if path
+            ))
+        
         if "scope" not in intent or not intent["scope"]:
-            intent["scope"] = ["app/components/Hero.tsx"]
+            intent["scope"] = self._resolve_scope("hero") or ["app/components/Hero.tsx"]
         
         if "rules" not in intent:
             intent["rules"] = self._generate_rules(intent["type"])
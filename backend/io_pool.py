@@ -0,0 +1,29 @@
+"""
+I/O Pool - Dedicated thread pool for blocking file and database work
+Lets async request handlers await storage calls without stalling the event loop
+"""
+
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+IO_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("IO_THREADS", 4)),
+    thread_name_prefix="storage-io"
+)
+
+
+async def run_io(func, *args, **kwargs):
+    """
+    Run a blocking callable on the I/O pool and await its result
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        IO_EXECUTOR, functools.partial(func, *args, **kwargs)
+    )
+
+
+def shutdown_io_pool():
+    """Wait for in-flight writes to finish, called on app shutdown"""
+    IO_EXECUTOR.shutdown(wait=True)
@@ -0,0 +1,58 @@
+"""
+Job Queue - In-process asyncio worker queue with bounded concurrency
+Runs slow webhook work (transcription, intent parsing) after the ack is sent
+"""
+
+import asyncio
+from typing import Awaitable, Callable
+
+
+class JobQueue:
+    """
+    Fixed pool of asyncio workers pulling jobs from a bounded queue
+    """
+    
+    def __init__(
+        self,
+        handler: Callable[[dict], Awaitable[None]],
+        concurrency: int = 4,
+        maxsize: int = 100
+    ):
+        self.handler = handler
+        self.concurrency = concurrency
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._workers: list[asyncio.Task] = []
+    
+    def start(self):
+        """Spawn the workers, must be called from a running event loop"""
+        for i in range(self.concurrency):
+            self._workers.append(asyncio.create_task(self._worker(i)))
+    
+    async def stop(self):
+        """Let queued jobs finish, then cancel the workers"""
+        await self.queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+    
+    def submit(self, job: dict) -> bool:
+        """
+        Enqueue a job without waiting
+        Returns False if the queue is full so the caller can fall back
+        """
+        try:
+            self.queue.put_nowait(job)
+            return True
+        except asyncio.QueueFull:
+            return False
+    
+    async def _worker(self, worker_id: int):
+        while True:
+            job = await self.queue.get()
+            try:
+                await self.handler(job)
+            except Exception as e:
+                print(f"Job worker {worker_id} failed: {e}")
+            finally:
+                self.queue.task_done()
@@ -0,0 +1,90 @@
+"""
+JSON Codec - Shared encode/decode for task and message files
+Selects between human-friendly stdlib output and compact fast encoders
+"""
+
+import os
+import json
+from typing import Callable
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+class Codec:
+    """
+    A named pair of encode/decode functions working on bytes
+    """
+
+    def __init__(self, name: str, encode: Callable, decode: Callable):
+        self.name = name
+        self.encode = encode
+        self.decode = decode
+
+    def __repr__(self) -> str:
+        return f"Codec({self.name!r})"
+
+
+def _pretty_encode(obj) -> bytes:
+    return json.dumps(obj, indent=2).encode("utf-8")
+
+
+def _compact_encode(obj) -> bytes:
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+CODECS = {
+    "pretty": Codec("pretty", _pretty_encode, json.loads),
+    "compact": Codec("compact", _compact_encode, json.loads),
+}
+
+if orjson is not None:
+    CODECS["orjson"] = Codec("orjson", orjson.dumps, orjson.loads)
+
+if msgspec is not None:
+    CODECS["msgspec"] = Codec("msgspec", msgspec.json.encode, msgspec.json.decode)
+
+
+def get_codec(name: str = None) -> Codec:
+    """
+    Look up a codec by name, defaulting to the JSON_CODEC env var
+    """
+    name = name or os.getenv("JSON_CODEC", "pretty")
+    if name not in CODECS:
+        if name in ("orjson", "msgspec"):
+            raise ValueError(f"JSON codec '{name}' requires the {name} package")
+        raise ValueError(f"Unknown JSON codec: {name}")
+    return CODECS[name]
+
+
+def fastest_compact_codec() -> Codec:
+    """
+    Fastest available single-line codec, used for JSON-lines and index rows
+    """
+    for name in ("orjson", "msgspec", "compact"):
+        if name in CODECS:
+            return CODECS[name]
+
+
+# Decode failures from every codec are ValueError subclasses
+DecodeError = ValueError
+
+# Every codec produces standard JSON, so one decoder reads all of them
+_decode = fastest_compact_codec().decode
+
+
+def dumps(obj, codec: Codec = None) -> bytes:
+    """Encode obj with the given codec (JSON_CODEC by default)"""
+    return (codec or get_codec()).encode(obj)
+
+
+def loads(data):
+    """Decode JSON bytes or str written by any codec"""
+    return _decode(data)
@@ -12,7 +12,7 @@ from typing import Optional
 
 from fastapi import FastAPI, Request, HTTPException, Form, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from twilio.twiml.messaging_response import MessagingResponse
@@ -22,6 +22,11 @@ from intent_parser import IntentParser
 from task_manager import TaskManager
 from message_store import MessageStore
 from voice_transcriber import VoiceTranscriber
+from io_pool import shutdown_io_pool
+from http_clients import http_clients
+from job_queue import JobQueue
+from notifier import create_notifier
+from idempotency import IdempotencyStore
 
 load_dotenv()
 
@@ -48,6 +53,56 @@ task_manager = TaskManager(tasks_dir)
 message_store = MessageStore()
 voice_transcriber = VoiceTranscriber()
 
+# "sync" answers in the webhook response, "fast_ack" acks immediately and
+# sends the result later through the Twilio REST API
+WEBHOOK_MODE = os.getenv("WEBHOOK_MODE", "sync")
+notifier = create_notifier() if WEBHOOK_MODE == "fast_ack" else None
+
+
+async def process_queued_message(job: dict):
+    """Background half of the fast-ack webhook"""
+    replies, _ = await process_message(**job)
+    if replies:
+        await notifier.send(job["sender"], "\n\n".join(replies))
+
+
+ERROR_REPLY = "❌ Sorry, there was an error processing your request. Please try again."
+
+# Responses by MessageSid, so Twilio retries don't redo the pipeline
+webhook_responses = IdempotencyStore(
+    ttl=float(os.getenv("WEBHOOK_DEDUP_TTL", 600)),
+    max_entries=int(os.getenv("WEBHOOK_DEDUP_SIZE", 10000))
+)
+
+job_queue = JobQueue(
+    process_queued_message,
+    concurrency=int(os.getenv("WEBHOOK_WORKERS", 4)),
+    maxsize=int(os.getenv("WEBHOOK_QUEUE_SIZE", 100))
+)
+
+
+@app.on_event("startup")
+async def startup():
+    """Start background workers and load local models"""
+    if WEBHOOK_MODE == "fast_ack":
+        job_queue.start()
+    if voice_transcriber.engine:
+        voice_transcriber.engine.warm_up()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Drain queued messages, flush storage writes and close HTTP pools before exiting"""
+    if WEBHOOK_MODE == "fast_ack":
+        await job_queue.stop()
+    await http_clients.aclose()
+    if voice_transcriber.engine:
+        voice_transcriber.engine.close()
+    if intent_parser.scopes:
+        intent_parser.scopes.close()
+    task_manager.close()
+    shutdown_io_pool()
+
 
 class ManualTaskRequest(BaseModel):
     """Manual task creation request"""
@@ -58,13 +113,25 @@ class ManualTaskRequest(BaseModel):
     auto_commit: bool = True
 
 
+class BulkTaskRequest(BaseModel):
+    """Bulk import request, e.g. lines from an exported WhatsApp chat"""
+    messages: list[str]
+    sender: str = "bulk-import"
+    concurrency: Optional[int] = None
+    pack_size: int = 1
+    create_tasks: bool = True
+
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
     return {
         "status": "running",
         "service": "WhatsApp Automation Pipeline",
-        "timestamp": datetime.utcnow().isoformat()
+        "timestamp": datetime.utcnow().isoformat(),
+        "intent_cache": intent_parser.cache.stats(),
+        "transcription_cache": voice_transcriber.cache.stats(),
+        "scope_index_files": intent_parser.scopes.file_count if intent_parser.scopes else None
     }
 
 
@@ -76,6 +143,7 @@ async def whatsapp_webhook(
     NumMedia: int = Form(default=0),
     MediaUrl0: Optional[str] = Form(default=None),
     MediaContentType0: Optional[str] = Form(default=None),
+    MessageSid: Optional[str] = Form(default=None),
 ):
     """
     Twilio WhatsApp webhook endpoint
@@ -85,61 +153,137 @@ async def whatsapp_webhook(
     # validator = RequestValidator(os.getenv("TWILIO_AUTH_TOKEN"))
     # ... validation logic
     
-    sender = From
-    message_text = Body
+    async def handle() -> tuple[str, bool]:
+        return await handle_whatsapp_message(
+            From, Body, NumMedia, MediaUrl0, MediaContentType0
+        )
+    
+    # Twilio retries slow webhooks with the same MessageSid
+    if MessageSid:
+        return await webhook_responses.run(MessageSid, handle)
+    twiml, _ = await handle()
+    return twiml
+
+
+async def handle_whatsapp_message(
+    sender: str,
+    body: str,
+    num_media: int,
+    media_url: Optional[str],
+    media_content_type: Optional[str]
+) -> tuple[str, bool]:
+    """
+    Process one inbound message and return the TwiML response
+    and whether it succeeded (failed responses aren't deduplicated)
+    """
+    is_voice = num_media > 0 and media_content_type and "audio" in media_content_type
+    media_url = media_url if is_voice else None
     response = MessagingResponse()
     
+    if WEBHOOK_MODE == "fast_ack":
+        try:
+            # Persist the raw message before acknowledging
+            stored = await message_store.store_message_async(
+                sender=sender,
+                content=body,
+                message_type="voice_pending" if is_voice else "text",
+                metadata={"original_url": media_url} if is_voice else None
+            )
+            
+            job = {"sender": sender, "message_text": body, "media_url": media_url, "stored": stored}
+            if job_queue.submit(job):
+                response.message("👍 Got it! Working on your request...")
+                return str(response), True
+            
+            print("Webhook queue full, processing inline")
+            replies, ok = await process_message(**job)
+        except Exception as e:
+            print(f"Error processing message: {e}")
+            replies, ok = [ERROR_REPLY], False
+    else:
+        replies, ok = await process_message(sender, body, media_url)
+    
+    for reply in replies:
+        response.message(reply)
+    
+    return str(response), ok
+
+
+async def process_message(
+    sender: str,
+    message_text: str,
+    media_url: Optional[str] = None,
+    stored: Optional[dict] = None
+) -> tuple[list[str], bool]:
+    """
+    Transcribe, parse and turn a message into a task
+    Returns the reply messages for the sender and False if processing failed
+    
+    stored is the record the fast-ack webhook already persisted; a voice
+    note's transcription is written into it rather than stored again.
+    """
+    replies = []
+    
     try:
         # Handle voice messages
-        if NumMedia > 0 and MediaContentType0 and "audio" in MediaContentType0:
+        if media_url:
             # Download and transcribe voice note
-            transcription = await voice_transcriber.transcribe_from_url(MediaUrl0)
+            transcription = await voice_transcriber.transcribe_from_url(media_url)
             message_text = transcription
             
-            # Store the voice message
-            message_store.store_message(
-                sender=sender,
-                content=transcription,
-                message_type="voice",
-                metadata={"original_url": MediaUrl0}
-            )
+            # Store the voice message, or fill in the pending one
+            if stored:
+                await message_store.update_message_async(
+                    stored,
+                    content=transcription,
+                    message_type="voice",
+                    metadata={"original_url": media_url}
+                )
+            else:
+                await message_store.store_message_async(
+                    sender=sender,
+                    content=transcription,
+                    message_type="voice",
+                    metadata={"original_url": media_url}
+                )
             
-            response.message(f"🎤 Transcribed: \"{transcription}\"")
-        else:
+            replies.append(f"🎤 Transcribed: \"{transcription}\"")
+        elif not stored:
             # Store text message
-            message_store.store_message(
+            await message_store.store_message_async(
                 sender=sender,
                 content=message_text,
                 message_type="text"
             )
         
         if not message_text:
-            response.message("Please send a text message or voice note describing the change you want to make.")
-            return str(response)
+            replies.append("Please send a text message or voice note describing the change you want to make.")
+            return replies, True
         
         # Parse intent from message
         intent = await intent_parser.parse(message_text)
         
         if intent.get("confidence", 0) < 0.5:
-            response.message(
+            replies.append(
                 "🤔 I'm not sure what change you want. Please be more specific.\n\n"
                 "Example: \"Change the hero button text to 'Book a Free Audit'\""
             )
-            return str(response)
+            return replies, True
         
         # Create task file
-        task = task_manager.create_task(
+        task = await task_manager.create_task_async(
             task_type=intent["type"],
             description=intent["description"],
             scope=intent["scope"],
             rules=intent.get("rules", []),
             auto_commit=intent.get("auto_commit", True),
             source_message=message_text,
-            sender=sender
+            sender=sender,
+            locations=intent.get("locations")
         )
         
         # Respond to user
-        response.message(
+        replies.append(
             f"✅ Task created!\n\n"
             f"📋 Type: {task['type']}\n"
             f"📝 {task['description']}\n"
@@ -149,11 +293,10 @@ async def whatsapp_webhook(
         
     except Exception as e:
         print(f"Error processing message: {e}")
-        response.message(
-            "❌ Sorry, there was an error processing your request. Please try again."
-        )
+        replies.append(ERROR_REPLY)
+        return replies, False
     
-    return str(response)
+    return replies, True
 
 
 @app.post("/tasks/create")
@@ -161,7 +304,7 @@ async def create_task_manually(task_request: ManualTaskRequest):
     """
     Create a task manually via API (for testing or integrations)
     """
-    task = task_manager.create_task(
+    task = await task_manager.create_task_async(
         task_type=task_request.type,
         description=task_request.description,
         scope=task_request.scope,
@@ -174,17 +317,52 @@ async def create_task_manually(task_request: ManualTaskRequest):
     return JSONResponse(content=task, status_code=201)
 
 
+@app.post("/tasks/bulk")
+async def create_tasks_bulk(bulk_request: BulkTaskRequest):
+    """
+    Parse many messages concurrently and create tasks for the confident ones
+    Streams one NDJSON line per message as soon as it is parsed
+    """
+    async def results():
+        parsed = intent_parser.parse_many(
+            bulk_request.messages,
+            concurrency=bulk_request.concurrency,
+            pack_size=bulk_request.pack_size
+        )
+        async for index, intent in parsed:
+            task = None
+            if bulk_request.create_tasks and intent.get("confidence", 0) >= 0.5:
+                task = await task_manager.create_task_async(
+                    task_type=intent["type"],
+                    description=intent["description"],
+                    scope=intent["scope"],
+                    rules=intent.get("rules", []),
+                    auto_commit=intent.get("auto_commit", True),
+                    source_message=bulk_request.messages[index],
+                    sender=bulk_request.sender,
+                    locations=intent.get("locations")
+                )
+            
+            yield json.dumps({"index": index, "intent": intent, "task": task}) + "\n"
+    
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
 @app.get("/tasks")
-async def list_tasks():
-    """List all pending tasks"""
-    tasks = task_manager.list_tasks()
-    return {"tasks": tasks, "count": len(tasks)}
+async def list_tasks(status: Optional[str] = None, limit: Optional[int] = None, offset: int = 0):
+    """List tasks, optionally filtered by status and paginated"""
+    tasks, total = await task_manager.page_tasks_async(status=status, limit=limit, offset=offset)
+    return {
+        "tasks": tasks,
+        "count": len(tasks),
+        "total": total
+    }
 
 
 @app.get("/tasks/{task_id}")
 async def get_task(task_id: str):
     """Get a specific task by ID"""
-    task = task_manager.get_task(task_id)
+    task = await task_manager.get_task_async(task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     return task
@@ -193,7 +371,7 @@ async def get_task(task_id: str):
 @app.delete("/tasks/{task_id}")
 async def delete_task(task_id: str):
     """Delete a task"""
-    success = task_manager.delete_task(task_id)
+    success = await task_manager.delete_task_async(task_id)
     if not success:
         raise HTTPException(status_code=404, detail="Task not found")
     return {"message": "Task deleted", "task_id": task_id}
@@ -202,7 +380,7 @@ async def delete_task(task_id: str):
 @app.get("/messages")
 async def list_messages(limit: int = 50):
     """List stored messages"""
-    messages = message_store.get_messages(limit=limit)
+    messages = await message_store.get_messages_async(limit=limit)
     return {"messages": messages, "count": len(messages)}
 
 
@@ -217,7 +395,7 @@ async def task_completed_webhook(request: Request):
     details = data.get("details", "")
     
     # Update task status
-    task_manager.update_task_status(task_id, status, details)
+    await task_manager.update_task_status_async(task_id, status, details)
     
     # TODO: Send WhatsApp notification back to user
     # This would use the Twilio API to send a message
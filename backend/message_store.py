@@ -2,26 +2,551 @@
 Message Store - Stores incoming WhatsApp messages for logging and analysis
 """
 
+import os
 import json
 import uuid
+import sqlite3
+import threading
+from collections import deque
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
+from io_pool import run_io
+from json_codec import Codec, DecodeError, loads, get_codec, fastest_compact_codec
 
-class MessageStore:
+
+# Number of messages kept by every backend
+MESSAGE_RETENTION = 1000
+
+
+class MessageBackend:
     """
-    Simple file-based message storage
-    In production, use a proper database
+    Storage backend interface used by MessageStore
+    Subclasses only need to implement append(), replace() and load()
     """
-    
-    def __init__(self, store_path: str = "../data/messages.json"):
+
+    # File backends are fronted by MessageCache, indexed ones are not
+    cacheable = True
+
+    def __init__(self, store_path: Path, retention: int = MESSAGE_RETENTION):
         self.store_path = Path(store_path)
+        self.retention = retention
+
+    def mtime(self) -> Optional[tuple]:
+        """Change token for the on-disk data, None if unknown"""
+        return None
+
+    def reload(self):
+        """Drop any in-memory bookkeeping after an external change"""
+
+    def append(self, message: dict):
+        """Persist a single message"""
+        raise NotImplementedError
+
+    def replace(self, message: dict) -> bool:
+        """Overwrite the retained message with the same id, False if it is gone"""
+        raise NotImplementedError
+
+    def load(self) -> list[dict]:
+        """Return retained messages, oldest first"""
+        raise NotImplementedError
+
+    def query(
+        self,
+        sender: str = None,
+        since: str = None,
+        limit: int = 50
+    ) -> list[dict]:
+        """
+        Return messages newest first with optional filtering
+        Backends with real indexes should override this
+        """
+        messages = self.load()
+
+        # Filter by sender
+        if sender:
+            messages = [m for m in messages if m["sender"] == sender]
+
+        # Filter by timestamp
+        if since:
+            messages = [m for m in messages if m["timestamp"] > since]
+
+        # Sort by timestamp descending
+        messages.sort(key=lambda m: m["timestamp"], reverse=True)
+
+        # Apply limit
+        return messages[:limit]
+
+
+class JSONFileBackend(MessageBackend):
+    """
+    Legacy backend - a single JSON array rewritten on every write
+    """
+
+    def __init__(
+        self,
+        store_path: Path,
+        retention: int = MESSAGE_RETENTION,
+        codec: Codec = None
+    ):
+        super().__init__(store_path, retention)
+        self.codec = codec or get_codec()
         self.store_path.parent.mkdir(parents=True, exist_ok=True)
-        
+
         if not self.store_path.exists():
             self._save_messages([])
-    
+
+    def append(self, message: dict):
+        messages = self.load()
+        messages.append(message)
+
+        # Keep only the retained window
+        if len(messages) > self.retention:
+            messages = messages[-self.retention:]
+
+        self._save_messages(messages)
+
+    def replace(self, message: dict) -> bool:
+        messages = self.load()
+        for i in range(len(messages) - 1, -1, -1):
+            if messages[i]["id"] == message["id"]:
+                messages[i] = message
+                self._save_messages(messages)
+                return True
+        return False
+
+    def mtime(self) -> Optional[tuple]:
+        return _stat_token(self.store_path)
+
+    def load(self) -> list[dict]:
+        """Load messages from file"""
+        try:
+            with open(self.store_path, "rb") as f:
+                return loads(f.read())
+        except (DecodeError, FileNotFoundError):
+            return []
+
+    def _save_messages(self, messages: list[dict]):
+        """Save messages to file"""
+        with open(self.store_path, "wb") as f:
+            f.write(self.codec.encode(messages))
+
+
+class SegmentLogBackend(MessageBackend):
+    """
+    Append-only JSON-lines log split into fixed-size segments
+
+    Each write appends one line to the active segment. When the active
+    segment is full a new one is started, and the oldest segments are
+    deleted once the remaining ones still cover the retention window.
+    Compaction rewrites the retained window into fresh segments and only
+    runs when the log needs repair (torn lines, legacy JSON import or
+    too many segments after a segment_size change).
+    """
+
+    SEGMENT_GLOB = "segment-*.jsonl"
+
+    def __init__(
+        self,
+        store_path: Path,
+        retention: int = MESSAGE_RETENTION,
+        segment_size: int = 100
+    ):
+        super().__init__(store_path, retention)
+        self.segment_size = segment_size
+
+        # Lines must stay single-line, so pretty codecs are never used here
+        self._encode = fastest_compact_codec().encode
+        self.max_segments = -(-retention // segment_size) + 1
+
+        # "../data/messages.json" -> "../data/messages/"
+        self.log_dir = self.store_path.with_suffix("")
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+
+        # Line counts per segment, oldest first
+        self._segments: list[tuple[Path, int]] = []
+        needs_compaction = self._scan_segments()
+
+        if self.store_path.is_file():
+            needs_compaction = self._import_legacy() or needs_compaction
+
+        if needs_compaction or len(self._segments) > self.max_segments:
+            self.compact()
+
+        if not self._segments:
+            self._segments.append((self._segment_path(1), 0))
+
+    def append(self, message: dict):
+        path, count = self._segments[-1]
+        line = self._encode(message) + b"\n"
+
+        with open(path, "ab") as f:
+            f.write(line)
+
+        self._segments[-1] = (path, count + 1)
+
+        if count + 1 >= self.segment_size:
+            self._rotate()
+
+    def replace(self, message: dict) -> bool:
+        # Updates are for recent messages, so search from the active segment back
+        for path, _ in reversed(self._segments):
+            messages, _ = self._read_segment(path)
+            for i, existing in enumerate(messages):
+                if existing["id"] == message["id"]:
+                    messages[i] = message
+                    self._rewrite_segment(path, messages)
+                    return True
+        return False
+
+    def mtime(self) -> Optional[tuple]:
+        # The directory changes on rotation, the active segment on append
+        return (_stat_token(self.log_dir), _stat_token(self._segments[-1][0]))
+
+    def reload(self):
+        self._segments = []
+        self._scan_segments()
+        if not self._segments:
+            self._segments.append((self._segment_path(1), 0))
+
+    def load(self) -> list[dict]:
+        messages = []
+        for path, _ in self._segments:
+            messages.extend(self._read_segment(path)[0])
+        return messages[-self.retention:]
+
+    def compact(self):
+        """
+        Rewrite the retained window into full segments
+        New segments are written before old ones are removed
+        """
+        messages = self.load()
+        old_paths = [path for path, _ in self._segments]
+        next_number = self._segment_number(old_paths[-1]) + 1 if old_paths else 1
+
+        segments = []
+        for start in range(0, len(messages), self.segment_size):
+            chunk = messages[start:start + self.segment_size]
+            path = self._segment_path(next_number)
+            self._rewrite_segment(path, chunk)
+            segments.append((path, len(chunk)))
+            next_number += 1
+
+        for path in old_paths:
+            path.unlink(missing_ok=True)
+
+        # Start a fresh active segment if the last one is full
+        if not segments or segments[-1][1] >= self.segment_size:
+            segments.append((self._segment_path(next_number), 0))
+
+        self._segments = segments
+
+    def _rotate(self):
+        """Start a new segment and drop segments outside the retention window"""
+        last_path, _ = self._segments[-1]
+        self._segments.append(
+            (self._segment_path(self._segment_number(last_path) + 1), 0)
+        )
+
+        total = sum(count for _, count in self._segments)
+        while len(self._segments) > 1 and total - self._segments[0][1] >= self.retention:
+            path, count = self._segments.pop(0)
+            path.unlink(missing_ok=True)
+            total -= count
+
+    def _scan_segments(self) -> bool:
+        """Index existing segments, returns True if any were damaged"""
+        damaged = False
+        for path in sorted(self.log_dir.glob(self.SEGMENT_GLOB)):
+            messages, torn = self._read_segment(path)
+            self._segments.append((path, len(messages)))
+            damaged = damaged or torn
+        return damaged
+
+    def _import_legacy(self) -> bool:
+        """Append messages from a pre-existing messages.json into the log"""
+        try:
+            with open(self.store_path, "rb") as f:
+                legacy = loads(f.read())
+        except (DecodeError, FileNotFoundError):
+            legacy = []
+
+        if legacy:
+            path = self._segment_path(1)
+            if self._segments:
+                path = self._segment_path(self._segment_number(self._segments[-1][0]) + 1)
+            with open(path, "wb") as f:
+                for message in legacy[-self.retention:]:
+                    f.write(self._encode(message) + b"\n")
+            self._segments.append((path, len(legacy[-self.retention:])))
+
+        self.store_path.rename(self.store_path.with_suffix(".json.migrated"))
+        return bool(legacy)
+
+    def _read_segment(self, path: Path) -> tuple[list[dict], bool]:
+        """Read one segment, skipping lines torn by a crash mid-write"""
+        messages = []
+        torn = False
+        try:
+            with open(path, "rb") as f:
+                for line in f:
+                    try:
+                        messages.append(loads(line))
+                    except DecodeError:
+                        torn = True
+        except FileNotFoundError:
+            pass
+        return messages, torn
+
+    def _rewrite_segment(self, path: Path, messages: list[dict]):
+        """Write a whole segment through a temp file so readers never see half of it"""
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            for message in messages:
+                f.write(self._encode(message) + b"\n")
+        tmp_path.replace(path)
+
+    def _segment_path(self, number: int) -> Path:
+        return self.log_dir / f"segment-{number:08d}.jsonl"
+
+    @staticmethod
+    def _segment_number(path: Path) -> int:
+        return int(path.stem.split("-")[1])
+
+
+class SQLiteBackend(MessageBackend):
+    """
+    SQLite backend (WAL mode) with indexes on (sender, timestamp) and timestamp
+    get_messages() becomes an index range scan with LIMIT
+    """
+
+    COLUMNS = "id, sender, content, type, metadata, timestamp"
+    cacheable = False
+
+    def __init__(self, store_path: Path, retention: int = MESSAGE_RETENTION):
+        super().__init__(store_path, retention)
+        self.db_path = self.store_path.with_suffix(".db")
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS messages (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                id TEXT NOT NULL,
+                sender TEXT NOT NULL,
+                content TEXT,
+                type TEXT,
+                metadata TEXT,
+                timestamp TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_messages_sender_ts
+                ON messages (sender, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_messages_ts
+                ON messages (timestamp);
+        """)
+
+        empty = self._conn.execute("SELECT 1 FROM messages LIMIT 1").fetchone() is None
+        if empty and self.store_path.is_file():
+            self._import_legacy()
+
+    def append(self, message: dict):
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                f"INSERT INTO messages ({self.COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)",
+                self._to_row(message)
+            )
+            # seq is monotonic, so the retention window is a primary key range
+            self._conn.execute(
+                "DELETE FROM messages WHERE seq <= ?",
+                (cursor.lastrowid - self.retention,)
+            )
+
+    def replace(self, message: dict) -> bool:
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE messages SET content = ?, type = ?, metadata = ? WHERE id = ?",
+                (
+                    message.get("content"),
+                    message.get("type"),
+                    json.dumps(message.get("metadata") or {}),
+                    message["id"],
+                )
+            )
+        return cursor.rowcount > 0
+
+    def load(self) -> list[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {self.COLUMNS} FROM messages ORDER BY seq"
+            ).fetchall()
+        return [self._from_row(row) for row in rows]
+
+    def query(
+        self,
+        sender: str = None,
+        since: str = None,
+        limit: int = 50
+    ) -> list[dict]:
+        clauses = []
+        params = []
+
+        if sender:
+            clauses.append("sender = ?")
+            params.append(sender)
+
+        if since:
+            clauses.append("timestamp > ?")
+            params.append(since)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = (
+            f"SELECT {self.COLUMNS} FROM messages {where} "
+            "ORDER BY timestamp DESC LIMIT ?"
+        )
+
+        with self._lock:
+            rows = self._conn.execute(sql, (*params, limit)).fetchall()
+        return [self._from_row(row) for row in rows]
+
+    def _import_legacy(self):
+        """Seed an empty database from a pre-existing messages.json"""
+        try:
+            with open(self.store_path, "rb") as f:
+                legacy = loads(f.read())
+        except (DecodeError, FileNotFoundError):
+            return
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT INTO messages ({self.COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)",
+                [self._to_row(m) for m in legacy[-self.retention:]]
+            )
+
+    @staticmethod
+    def _to_row(message: dict) -> tuple:
+        return (
+            message["id"],
+            message["sender"],
+            message.get("content"),
+            message.get("type"),
+            json.dumps(message.get("metadata") or {}),
+            message["timestamp"],
+        )
+
+    @staticmethod
+    def _from_row(row: tuple) -> dict:
+        return {
+            "id": row[0],
+            "sender": row[1],
+            "content": row[2],
+            "type": row[3],
+            "metadata": json.loads(row[4]) if row[4] else {},
+            "timestamp": row[5],
+        }
+
+
+def _stat_token(path: Path) -> Optional[tuple]:
+    """(mtime_ns, size) of a path, None if it does not exist"""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class MessageCache:
+    """
+    In-memory ring buffer of the retained messages plus a per-sender index
+    Both are kept in insertion order, which is timestamp order
+    """
+
+    def __init__(self, retention: int = MESSAGE_RETENTION):
+        self.messages: deque = deque(maxlen=retention)
+        self.by_sender: dict[str, deque] = {}
+
+    def rebuild(self, messages: list[dict]):
+        self.messages.clear()
+        self.by_sender.clear()
+        for message in sorted(messages, key=lambda m: m["timestamp"]):
+            self.add(message)
+
+    def add(self, message: dict):
+        # Evict the oldest message from its sender bucket as well
+        if len(self.messages) == self.messages.maxlen:
+            oldest = self.messages[0]
+            bucket = self.by_sender[oldest["sender"]]
+            bucket.popleft()
+            if not bucket:
+                del self.by_sender[oldest["sender"]]
+
+        self.messages.append(message)
+        self.by_sender.setdefault(message["sender"], deque()).append(message)
+
+    def replace(self, message: dict):
+        for source in (self.messages, self.by_sender.get(message["sender"], ())):
+            for i in range(len(source) - 1, -1, -1):
+                if source[i]["id"] == message["id"]:
+                    source[i] = message
+                    break
+
+    def query(
+        self,
+        sender: str = None,
+        since: str = None,
+        limit: int = 50
+    ) -> list[dict]:
+        source = self.by_sender.get(sender, ()) if sender else self.messages
+
+        results = []
+        for message in reversed(source):
+            if len(results) >= limit:
+                break
+            if since and message["timestamp"] <= since:
+                break
+            results.append(message)
+        return results
+
+
+BACKENDS = {
+    "segment_log": SegmentLogBackend,
+    "json": JSONFileBackend,
+    "sqlite": SQLiteBackend,
+}
+
+
+class MessageStore:
+    """
+    Simple file-based message storage
+    The storage engine is pluggable via MESSAGE_STORE_BACKEND
+    """
+
+    def __init__(
+        self,
+        store_path: str = "../data/messages.json",
+        backend: str = None
+    ):
+        self.store_path = Path(store_path)
+        self.store_path.parent.mkdir(parents=True, exist_ok=True)
+
+        backend = backend or os.getenv("MESSAGE_STORE_BACKEND", "segment_log")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown message store backend: {backend}")
+        self.backend = BACKENDS[backend](self.store_path)
+
+        # Serializes backend and cache access across I/O pool threads
+        self._lock = threading.Lock()
+
+        # Write-through cache, this process is the only expected writer
+        self.cache = None
+        self._cache_token = None
+        if self.backend.cacheable:
+            self.cache = MessageCache(self.backend.retention)
+            self._refresh_cache(force=True)
+
     def store_message(
         self,
         sender: str,
@@ -40,17 +565,60 @@ class MessageStore:
             "metadata": metadata or {},
             "timestamp": datetime.utcnow().isoformat() + "Z"
         }
-        
-        messages = self._load_messages()
-        messages.append(message)
-        
-        # Keep only last 1000 messages
-        if len(messages) > 1000:
-            messages = messages[-1000:]
-        
-        self._save_messages(messages)
+
+        with self._lock:
+            self._refresh_cache()
+            self.backend.append(message)
+
+            if self.cache is not None:
+                self.cache.add(message)
+                self._cache_token = self.backend.mtime()
+
         return message
-    
+
+    async def store_message_async(self, *args, **kwargs) -> dict:
+        """
+        store_message() run on the I/O pool, for use from async handlers
+        """
+        return await run_io(self.store_message, *args, **kwargs)
+
+    def update_message(
+        self,
+        message: dict,
+        content: str,
+        message_type: str,
+        metadata: dict = None
+    ) -> dict:
+        """
+        Rewrite a stored message in place, keeping its id, sender and timestamp
+        Stores it as a new message if it has already left the retention window
+        """
+        updated = {
+            **message,
+            "content": content,
+            "type": message_type,
+            "metadata": metadata or {}
+        }
+
+        with self._lock:
+            self._refresh_cache()
+            if not self.backend.replace(updated):
+                self.backend.append(updated)
+                if self.cache is not None:
+                    self.cache.add(updated)
+            elif self.cache is not None:
+                self.cache.replace(updated)
+            if self.cache is not None:
+                self._cache_token = self.backend.mtime()
+
+        return updated
+
+    async def update_message_async(self, *args, **kwargs) -> dict:
+        """
+        update_message() run on the I/O pool, for use from async handlers
+        """
+        return await run_io(self.update_message, *args, **kwargs)
+
     def get_messages(
         self,
         sender: str = None,
@@ -60,37 +628,33 @@ class MessageStore:
         """
         Get stored messages with optional filtering
         """
-        messages = self._load_messages()
-        
-        # Filter by sender
-        if sender:
-            messages = [m for m in messages if m["sender"] == sender]
-        
-        # Filter by timestamp
-        if since:
-            messages = [m for m in messages if m["timestamp"] > since]
-        
-        # Sort by timestamp descending
-        messages.sort(key=lambda m: m["timestamp"], reverse=True)
-        
-        # Apply limit
-        return messages[:limit]
-    
+        if self.cache is None:
+            return self.backend.query(sender=sender, since=since, limit=limit)
+
+        with self._lock:
+            self._refresh_cache()
+            return self.cache.query(sender=sender, since=since, limit=limit)
+
+    async def get_messages_async(self, *args, **kwargs) -> list[dict]:
+        """
+        get_messages() run on the I/O pool, for use from async handlers
+        """
+        return await run_io(self.get_messages, *args, **kwargs)
+
     def get_conversation(self, sender: str, limit: int = 20) -> list[dict]:
         """
         Get conversation history for a specific sender
         """
         return self.get_messages(sender=sender, limit=limit)
-    
-    def _load_messages(self) -> list[dict]:
-        """Load messages from file"""
-        try:
-            with open(self.store_path) as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
-            return []
-    
-    def _save_messages(self, messages: list[dict]):
-        """Save messages to file"""
-        with open(self.store_path, "w") as f:
-            json.dump(messages, f, indent=2)
+
+    def _refresh_cache(self, force: bool = False):
+        """Rebuild the cache from disk if the file changed behind our back"""
+        if self.cache is None:
+            return
+
+        token = self.backend.mtime()
+        if force or token != self._cache_token:
+            if not force:
+                self.backend.reload()
+            self.cache.rebuild(self.backend.load())
+            self._cache_token = self.backend.mtime()
@@ -0,0 +1,63 @@
+"""
+Notifier - Sends outbound WhatsApp messages through the Twilio REST API
+Used when the webhook has already been acknowledged and replies go out later
+"""
+
+import os
+from dotenv import load_dotenv
+
+from http_clients import http_clients
+
+load_dotenv()
+
+
+class TwilioNotifier:
+    """
+    Sends WhatsApp messages through the Twilio Messages REST endpoint
+    """
+    
+    API_URL = "https://api.twilio.com/2010-04-01/Accounts/{sid}/Messages.json"
+    
+    def __init__(self):
+        self.account_sid = os.getenv("TWILIO_ACCOUNT_SID")
+        self.auth_token = os.getenv("TWILIO_AUTH_TOKEN")
+        self.from_number = os.getenv("TWILIO_WHATSAPP_NUMBER")
+    
+    async def send(self, to: str, body: str):
+        """
+        Send a message over the shared Twilio connection pool
+        """
+        response = await http_clients.get("twilio").post(
+            self.API_URL.format(sid=self.account_sid),
+            auth=(self.account_sid, self.auth_token),
+            data={"From": self.from_number, "To": to, "Body": body}
+        )
+        response.raise_for_status()
+
+
+class StubNotifier:
+    """
+    Local stand-in for Twilio - records messages instead of sending them
+    """
+    
+    def __init__(self):
+        self.sent: list[dict] = []
+    
+    async def send(self, to: str, body: str):
+        self.sent.append({"to": to, "body": body})
+        print(f"[stub notifier] -> {to}: {body}")
+
+
+def create_notifier():
+    """
+    Pick a notifier from NOTIFIER (twilio / stub)
+    Defaults to Twilio when credentials are configured
+    """
+    default = "twilio" if os.getenv("TWILIO_ACCOUNT_SID") else "stub"
+    kind = os.getenv("NOTIFIER", default)
+    
+    if kind == "twilio":
+        return TwilioNotifier()
+    if kind == "stub":
+        return StubNotifier()
+    raise ValueError(f"Unknown notifier: {kind}")
@@ -0,0 +1,436 @@
+"""
+Scope Resolver - Index of the target repo's files for keyword -> file lookups
+Only returns paths that exist, and stays current through file-change events
+"""
+
+import os
+import re
+import bisect
+import threading
+import time
+from pathlib import Path
+from typing import Iterator, Optional
+
+from text_index import TextIndex
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+
+# Indexed file types, most likely edit target first (breaks ranking ties)
+SOURCE_EXTENSIONS = (
+    ".tsx", ".jsx", ".ts", ".js", ".mjs", ".vue", ".svelte", ".astro",
+    ".html", ".css", ".scss",
+)
+EXTENSION_RANK = {ext: rank for rank, ext in enumerate(SOURCE_EXTENSIONS)}
+
+IGNORED_DIRS = {
+    ".git", "node_modules", ".next", ".nuxt", ".vercel", ".turbo", ".cache",
+    "dist", "build", "out", "coverage", "__pycache__",
+}
+
+# Files whose name says nothing; they're named after their directory instead
+GENERIC_STEMS = {"index", "page", "route", "main", "mod"}
+
+# Bigger files are indexed by path only
+MAX_PARSE_BYTES = 512 * 1024
+
+# Without watchdog, a lookup miss starts a background rescan at most this often
+RESCAN_INTERVAL = 30.0
+
+EXPORT_DECL_RE = re.compile(
+    r"export\s+(?:default\s+)?(?:async\s+)?"
+    r"(?:function\*?|class|const|let|var|interface|type|enum)\s+([A-Za-z_$][\w$]*)"
+)
+EXPORT_DEFAULT_RE = re.compile(r"export\s+default\s+([A-Za-z_$][\w$]*)\s*;?\s*$", re.MULTILINE)
+EXPORT_LIST_RE = re.compile(r"export\s*\{([^}]*)\}")
+WORD_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+# Name weights: how strongly a name identifies its file
+WEIGHT_STEM = 3
+WEIGHT_EXPORT = 2
+WEIGHT_WORD = 1
+
+
+class PathTrie:
+    """
+    Directory tree of indexed files, one node per path segment
+    Files are None leaves; removing a directory drops its whole subtree
+    """
+
+    def __init__(self):
+        self.root: dict = {}
+
+    def insert(self, parts: tuple[str, ...]):
+        node = self.root
+        for part in parts[:-1]:
+            child = node.get(part)
+            if not isinstance(child, dict):
+                child = node[part] = {}
+            node = child
+        node[parts[-1]] = None
+
+    def contains(self, parts: tuple[str, ...]) -> bool:
+        node = self.root
+        for part in parts[:-1]:
+            node = node.get(part)
+            if not isinstance(node, dict):
+                return False
+        return parts[-1] in node and node[parts[-1]] is None
+
+    def remove(self, parts: tuple[str, ...]) -> list[str]:
+        """Remove a file or directory, returning the file paths that were dropped"""
+        node = self.root
+        for part in parts[:-1]:
+            node = node.get(part)
+            if not isinstance(node, dict):
+                return []
+        if parts[-1] not in node:
+            return []
+        removed = node.pop(parts[-1])
+        if removed is None:
+            return ["/".join(parts)]
+        return list(self._walk(removed, parts))
+
+    def files(self, prefix: tuple[str, ...] = ()) -> Iterator[str]:
+        node = self.root
+        for part in prefix:
+            node = node.get(part)
+            if not isinstance(node, dict):
+                return iter(())
+        return self._walk(node, prefix)
+
+    def _walk(self, node: dict, parts: tuple[str, ...]) -> Iterator[str]:
+        for name, child in node.items():
+            if child is None:
+                yield "/".join(parts + (name,))
+            else:
+                yield from self._walk(child, parts + (name,))
+
+
+def file_names(rel_path: str, source: str = "") -> dict[str, int]:
+    """Lowercased names a file answers to, with their weights"""
+    parts = rel_path.split("/")
+    stem = parts[-1].split(".")[0]
+    if stem.lower() in GENERIC_STEMS and len(parts) > 1:
+        stem = parts[-2]
+
+    names = {stem.lower(): WEIGHT_STEM}
+    exports = set(EXPORT_DECL_RE.findall(source)) | set(EXPORT_DEFAULT_RE.findall(source))
+    for group in EXPORT_LIST_RE.findall(source):
+        for item in group.split(","):
+            # "Foo as Bar" exports Bar
+            name = item.strip().split()[-1] if item.strip() else ""
+            if name and name != "default":
+                exports.add(name)
+
+    for name in exports:
+        names.setdefault(name.lower(), WEIGHT_EXPORT)
+    for name in [stem, *exports]:
+        words = WORD_RE.findall(name)
+        if len(words) > 1:
+            for word in words:
+                names.setdefault(word.lower(), WEIGHT_WORD)
+    return names
+
+
+class ScopeResolver:
+    """
+    Keeps a path trie and a name -> files index for one repository
+
+    Names come from file stems (directory names for index/page files),
+    exported identifiers and their camelCase words, so "hero" finds
+    Hero.tsx and "form" finds ContactForm.tsx. Lookups only return files
+    that are in the index and still on disk.
+
+    With a TextIndex attached, file contents are indexed on the same
+    add/remove path, so phrase lookups stay as fresh as name lookups.
+    """
+
+    def __init__(self, repo_path: str, text_index: Optional[TextIndex] = None, scan: bool = True):
+        self.repo_path = Path(repo_path).resolve()
+        self.text_index = text_index
+        self._trie = PathTrie()
+        self._names: dict[str, dict[str, int]] = {}
+        self._file_names: dict[str, dict[str, int]] = {}
+        self._sorted_names: list[str] = []
+        self._names_dirty = False
+        self._lock = threading.RLock()
+        self._observer = None
+        self._last_scan = 0.0
+        self._rescanning = False
+        self.ready = False  # set once the first scan() has finished
+        if scan:
+            self.scan()
+
+    @property
+    def file_count(self) -> int:
+        return len(self._file_names)
+
+    def scan(self):
+        """
+        Full rebuild; used at startup and as the no-watchdog fallback
+        The lock is taken per file so lookups aren't blocked for the whole walk
+        """
+        found = {}
+        for root, dirs, files in os.walk(self.repo_path):
+            dirs[:] = [d for d in dirs if d not in IGNORED_DIRS and not d.startswith(".")]
+            for name in files:
+                if name.endswith(SOURCE_EXTENSIONS):
+                    path = Path(root) / name
+                    found[path.relative_to(self.repo_path).as_posix()] = path
+
+        with self._lock:
+            self._trie = PathTrie()
+            self._names = {}
+            self._file_names = {}
+            self._names_dirty = True
+            if self.text_index is not None:
+                self.text_index.clear()
+            self._last_scan = time.monotonic()
+
+        for rel_path, path in found.items():
+            source = self._read(rel_path, path)
+            if source is None:
+                continue
+            with self._lock:
+                self._drop(rel_path)
+                self._add(rel_path, source)
+                self._names_dirty = True
+        self.ready = True
+
+    def update(self, rel_path: str):
+        """(Re)index one file, or drop it if it no longer exists"""
+        path = self.repo_path / rel_path
+        source = self._read(rel_path, path) if self._indexable(rel_path) else None
+        with self._lock:
+            self._drop(rel_path)
+            if source is not None:
+                self._add(rel_path, source)
+                self._names_dirty = True
+
+    def remove(self, rel_path: str):
+        """Drop a file or a whole directory from the index"""
+        with self._lock:
+            self._drop(rel_path)
+
+    def exists(self, rel_path: str) -> bool:
+        parts = tuple(Path(rel_path).as_posix().strip("/").split("/"))
+        with self._lock:
+            return self._trie.contains(parts)
+
+    def files_under(self, prefix: str) -> list[str]:
+        parts = tuple(p for p in prefix.strip("/").split("/") if p)
+        with self._lock:
+            return sorted(self._trie.files(parts))
+
+    def resolve(self, keyword: str, hints: list[str] = (), limit: int = 3) -> list[str]:
+        """
+        Existing files for a keyword, best match first
+        Hint paths that exist come first, then exact name matches, then prefix matches
+        """
+        results = self._lookup(keyword.lower(), hints, limit)
+        if not results and self._observer is None:
+            self._rescan_in_background()
+        return results
+
+    def resolve_path(self, rel_path: str) -> Optional[str]:
+        """
+        A guessed path if the file exists in the repo, indexed or not,
+        otherwise the best indexed file with the same name
+        """
+        path = (self.repo_path / rel_path).resolve()
+        if path.is_relative_to(self.repo_path) and path.is_file():
+            return rel_path
+
+        # Until the first scan finishes the index can't offer anything better
+        if not self.ready:
+            return rel_path
+        matches = self.resolve(Path(rel_path).name.split(".")[0], limit=1)
+        return matches[0] if matches else None
+
+    def watch(self) -> bool:
+        """Follow file-change events under the repo; False if watchdog isn't installed"""
+        if Observer is None:
+            return False
+
+        resolver = self
+
+        class RepoEventHandler(FileSystemEventHandler):
+            def on_created(self, event):
+                resolver._on_change(event.src_path, event.is_directory)
+
+            def on_modified(self, event):
+                if not event.is_directory:
+                    resolver._on_change(event.src_path, False)
+
+            def on_deleted(self, event):
+                rel_path = resolver._relative(event.src_path)
+                if rel_path:
+                    resolver.remove(rel_path)
+
+            def on_moved(self, event):
+                self.on_deleted(event)
+                resolver._on_change(event.dest_path, event.is_directory)
+
+        self._observer = Observer()
+        self._observer.schedule(RepoEventHandler(), str(self.repo_path), recursive=True)
+        self._observer.daemon = True
+        self._observer.start()
+        return True
+
+    def close(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+
+    def _rescan_in_background(self):
+        """Pick up files added without change events; the caller doesn't wait for it"""
+        with self._lock:
+            if self._rescanning or time.monotonic() - self._last_scan <= RESCAN_INTERVAL:
+                return
+            self._rescanning = True
+            self._last_scan = time.monotonic()
+
+        def rescan():
+            try:
+                self.scan()
+            finally:
+                self._rescanning = False
+
+        threading.Thread(target=rescan, name="scope-rescan", daemon=True).start()
+
+    def _lookup(self, keyword: str, hints: list[str], limit: int) -> list[str]:
+        with self._lock:
+            if self._names_dirty:
+                self._sorted_names = sorted(self._names)
+                self._names_dirty = False
+
+            scored = {}
+            for rank, hint in enumerate(hints):
+                if self._trie.contains(tuple(hint.split("/"))):
+                    scored.setdefault(hint, (0, rank))
+
+            start = bisect.bisect_left(self._sorted_names, keyword)
+            for name in self._sorted_names[start:]:
+                if not name.startswith(keyword):
+                    break
+                exact = name == keyword
+                if not exact and len(keyword) < 3:
+                    continue
+                for rel_path, weight in self._names[name].items():
+                    score = (1 if exact else 2, -weight)
+                    if rel_path not in scored or score < scored[rel_path]:
+                        scored[rel_path] = score
+
+        ranked = sorted(scored, key=lambda p: (scored[p], self._path_rank(p), p))
+
+        # Drop anything deleted behind the watcher's back
+        results = []
+        for rel_path in ranked:
+            if (self.repo_path / rel_path).is_file():
+                results.append(rel_path)
+                if len(results) == limit:
+                    break
+            else:
+                self.remove(rel_path)
+        return results
+
+    @staticmethod
+    def _path_rank(rel_path: str) -> tuple:
+        parts = rel_path.split("/")
+        ext = "." + parts[-1].rsplit(".", 1)[-1]
+        in_components = any(p.lower() == "components" for p in parts)
+        return (not in_components, EXTENSION_RANK.get(ext, len(EXTENSION_RANK)), len(parts))
+
+    def _indexable(self, rel_path: str) -> bool:
+        parts = rel_path.split("/")
+        return rel_path.endswith(SOURCE_EXTENSIONS) and not any(
+            p in IGNORED_DIRS or p.startswith(".") for p in parts[:-1]
+        )
+
+    @staticmethod
+    def _read(rel_path: str, path: Path) -> Optional[str]:
+        """File text for name/text indexing ("" if too big or a stylesheet), None if unreadable"""
+        try:
+            if path.stat().st_size > MAX_PARSE_BYTES or rel_path.endswith((".css", ".scss")):
+                return ""
+            return path.read_text(encoding="utf-8", errors="ignore")
+        except OSError:
+            return None
+
+    def _add(self, rel_path: str, source: str):
+        names = file_names(rel_path, source)
+        if self.text_index is not None and source:
+            self.text_index.add(rel_path, source)
+        self._trie.insert(tuple(rel_path.split("/")))
+        self._file_names[rel_path] = names
+        for name, weight in names.items():
+            self._names.setdefault(name, {})[rel_path] = weight
+
+    def _drop(self, rel_path: str):
+        for removed in self._trie.remove(tuple(rel_path.split("/"))):
+            if self.text_index is not None:
+                self.text_index.remove(removed)
+            for name in self._file_names.pop(removed, {}):
+                paths = self._names.get(name)
+                if paths is not None:
+                    paths.pop(removed, None)
+                    if not paths:
+                        del self._names[name]
+                        self._names_dirty = True
+
+    def _relative(self, abs_path: str) -> Optional[str]:
+        try:
+            return Path(abs_path).resolve().relative_to(self.repo_path).as_posix()
+        except ValueError:
+            return None
+
+    def _on_change(self, abs_path: str, is_directory: bool):
+        rel_path = self._relative(abs_path)
+        if not rel_path:
+            return
+        if not is_directory:
+            if self._indexable(rel_path):
+                self.update(rel_path)
+            return
+
+        # A directory appeared (e.g. moved in): index everything below it
+        if any(p in IGNORED_DIRS or p.startswith(".") for p in rel_path.split("/")):
+            return
+        for root, dirs, files in os.walk(abs_path):
+            dirs[:] = [d for d in dirs if d not in IGNORED_DIRS and not d.startswith(".")]
+            for name in files:
+                self._on_change(os.path.join(root, name), False)
+
+
+def create_scope_resolver() -> Optional[ScopeResolver]:
+    """
+    Index TARGET_REPO_PATH if it points at a checkout on this machine
+    """
+    repo_path = os.getenv("TARGET_REPO_PATH")
+    if not repo_path or not Path(repo_path).is_dir():
+        return None
+
+    text_index = None
+    if os.getenv("SCOPE_TEXT_INDEX", "true").lower() in ("1", "true", "yes"):
+        text_index = TextIndex(repo_path)
+
+    resolver = ScopeResolver(repo_path, text_index, scan=False)
+    watching = resolver.watch()
+
+    # Large repos take seconds to index; don't hold up startup for it
+    def initial_scan():
+        started = time.perf_counter()
+        resolver.scan()
+        print(
+            f"Indexed {resolver.file_count} files in {repo_path} "
+            f"({(time.perf_counter() - started) * 1000:.0f} ms, "
+            f"{'watching for changes' if watching else 'watchdog not installed, rescanning on misses'})"
+        )
+
+    threading.Thread(target=initial_scan, name="scope-index", daemon=True).start()
+    return resolver
@@ -3,25 +3,193 @@ Task Manager - Creates and manages CHANGE.json task files
 """
 
 import os
-import json
 import uuid
+import sqlite3
+import threading
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
+from io_pool import run_io
+from json_codec import Codec, DecodeError, dumps, loads, get_codec, fastest_compact_codec
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+
+# Change events that can alter a task file (not opens or read-only closes)
+TASK_FILE_EVENTS = {"created", "modified", "closed", "moved", "deleted"}
+
+
+# How hard task writes try to survive a crash
+#   none       - atomic rename only, data may still sit in the page cache
+#   fsync-file - fsync the file contents before the rename
+#   fsync-dir  - additionally fsync the directory so the rename is durable
+DURABILITY_MODES = ("none", "fsync-file", "fsync-dir")
+
+
+def write_json_atomic(
+    path: Path,
+    data,
+    durability: str = "none",
+    codec: Codec = None
+):
+    """
+    Write JSON to a temp file in the same directory and os.replace() it
+    Readers see either the old file or the new one, never a truncated one
+    """
+    # Leading dot keeps the temp file out of CHANGE-*.json watchers
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(dumps(data, codec))
+            if durability != "none":
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    if durability == "fsync-dir":
+        fsync_dir(path.parent)
+
+
+def fsync_dir(directory: Path):
+    """Persist directory entries (creates, renames) to disk"""
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class TaskIndex:
+    """
+    SQLite catalog of task files so listings don't parse the whole directory
+
+    Kept in sync by TaskManager. Each row records its file's (mtime_ns, size),
+    so files added, removed or rewritten in place by other writers (git pull,
+    the watcher, the extension) can be told apart from ones already indexed.
+    """
+
+    def __init__(self, db_path: Path):
+        self._codec = fastest_compact_codec()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id TEXT PRIMARY KEY,
+                status TEXT,
+                created_at TEXT,
+                archived INTEGER NOT NULL DEFAULT 0,
+                body TEXT NOT NULL,
+                mtime_ns INTEGER,
+                size INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS idx_tasks_status_created
+                ON tasks (archived, status, created_at);
+            CREATE INDEX IF NOT EXISTS idx_tasks_created
+                ON tasks (archived, created_at);
+        """)
+
+        # Catalogs from before stats were tracked: rows re-read on first sync
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(tasks)")}
+        with self._conn:
+            for column in ("mtime_ns", "size"):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE tasks ADD COLUMN {column} INTEGER")
+
+    def upsert(self, task: dict, archived: bool = False, stat: os.stat_result = None):
+        """Store a task; stat is its file's stat as of the body being stored"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tasks (id, status, created_at, archived, body, mtime_ns, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    task["id"],
+                    task.get("status"),
+                    task.get("created_at", ""),
+                    int(archived),
+                    self._codec.encode(task),
+                    stat.st_mtime_ns if stat else None,
+                    stat.st_size if stat else None,
+                )
+            )
+
+    def remove(self, task_id: str):
+        """Drop an active task; archived rows stay"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM tasks WHERE id = ? AND archived = 0", (task_id,))
+
+    def query(
+        self,
+        status: str = None,
+        limit: int = None,
+        offset: int = 0
+    ) -> list[dict]:
+        """Active tasks newest first, served from the (status, created_at) index"""
+        sql = "SELECT body FROM tasks WHERE archived = 0"
+        params = []
+
+        if status is not None:
+            sql += " AND status = ?"
+            params.append(status)
+
+        sql += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
+        params += [limit if limit is not None else -1, offset]
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [loads(row[0]) for row in rows]
+
+    def count(self, status: str = None) -> int:
+        sql = "SELECT COUNT(*) FROM tasks WHERE archived = 0"
+        params = []
+        if status is not None:
+            sql += " AND status = ?"
+            params.append(status)
+
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()[0]
+
+    def active_stats(self) -> dict[str, tuple]:
+        """task_id -> (mtime_ns, size) recorded for each active task"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, mtime_ns, size FROM tasks WHERE archived = 0"
+            ).fetchall()
+        return {row[0]: (row[1], row[2]) for row in rows}
+
 
 class TaskManager:
     """
     Manages task files in the tasks directory
     """
     
-    def __init__(self, tasks_dir: Path):
+    def __init__(self, tasks_dir: Path, durability: str = None, codec: str = None):
         self.tasks_dir = tasks_dir
+        self.codec = get_codec(codec)
+        self.durability = durability or os.getenv("TASK_DURABILITY", "none")
+        if self.durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown task durability mode: {self.durability}")
         self.tasks_dir.mkdir(parents=True, exist_ok=True)
         
         # Archive completed tasks
         self.archive_dir = tasks_dir / "archive"
         self.archive_dir.mkdir(exist_ok=True)
+
+        # Catalog lives next to the tasks but doesn't match CHANGE-*.json
+        self.index = TaskIndex(tasks_dir / ".task_index.db")
+
+        # Task ids named by change events since the last sync
+        self._dirty: set[str] = set()
+        self._dirty_lock = threading.Lock()
+        self._observer = self._watch()
+        self._sync_index(full=True)
     
     def create_task(
         self,
@@ -31,10 +199,12 @@ class TaskManager:
         rules: list[str] = None,
         auto_commit: bool = True,
         source_message: str = "",
-        sender: str = ""
+        sender: str = "",
+        locations: list[dict] = None
     ) -> dict:
         """
         Create a new task file (CHANGE.json)
+        locations pins the change to [{"file": path, "lines": [start, end]}]
         """
         task_id = str(uuid.uuid4())[:8]
         timestamp = datetime.utcnow().isoformat() + "Z"
@@ -55,33 +225,74 @@ class TaskManager:
             },
             "result": None
         }
+        if locations:
+            task["locations"] = locations
         
         # Write task file
         task_file = self.tasks_dir / f"CHANGE-{task_id}.json"
-        with open(task_file, "w") as f:
-            json.dump(task, f, indent=2)
+        write_json_atomic(task_file, task, self.durability, self.codec)
         
+        self.index.upsert(task, stat=task_file.stat())
         print(f"Created task: {task_file}")
         return task
     
-    def list_tasks(self, status: str = None) -> list[dict]:
+    async def create_task_async(self, *args, **kwargs) -> dict:
         """
-        List all task files, optionally filtered by status
+        create_task() run on the I/O pool, for use from async handlers
         """
-        tasks = []
-        
-        for task_file in self.tasks_dir.glob("CHANGE-*.json"):
-            try:
-                with open(task_file) as f:
-                    task = json.load(f)
-                    if status is None or task.get("status") == status:
-                        tasks.append(task)
-            except (json.JSONDecodeError, IOError) as e:
-                print(f"Error reading task file {task_file}: {e}")
-        
-        # Sort by creation time
-        tasks.sort(key=lambda t: t.get("created_at", ""), reverse=True)
-        return tasks
+        return await run_io(self.create_task, *args, **kwargs)
+    
+    def list_tasks(
+        self,
+        status: str = None,
+        limit: int = None,
+        offset: int = 0
+    ) -> list[dict]:
+        """
+        List active tasks newest first, optionally filtered by status
+        """
+        self._sync_index()
+        return self.index.query(status=status, limit=limit, offset=offset)
+    
+    def page_tasks(
+        self,
+        status: str = None,
+        limit: int = None,
+        offset: int = 0
+    ) -> tuple[list[dict], int]:
+        """
+        list_tasks() and count_tasks() for one request, syncing the index once
+        """
+        self._sync_index()
+        return (
+            self.index.query(status=status, limit=limit, offset=offset),
+            self.index.count(status=status)
+        )
+    
+    def count_tasks(self, status: str = None) -> int:
+        """
+        Count active tasks, optionally filtered by status
+        """
+        self._sync_index()
+        return self.index.count(status=status)
+    
+    async def list_tasks_async(self, *args, **kwargs) -> list[dict]:
+        """
+        list_tasks() run on the I/O pool, for use from async handlers
+        """
+        return await run_io(self.list_tasks, *args, **kwargs)
+    
+    async def count_tasks_async(self, *args, **kwargs) -> int:
+        """
+        count_tasks() run on the I/O pool, for use from async handlers
+        """
+        return await run_io(self.count_tasks, *args, **kwargs)
+    
+    async def page_tasks_async(self, *args, **kwargs) -> tuple[list[dict], int]:
+        """
+        page_tasks() run on the I/O pool, for use from async handlers
+        """
+        return await run_io(self.page_tasks, *args, **kwargs)
     
     def get_task(self, task_id: str) -> Optional[dict]:
         """
@@ -94,11 +305,17 @@ class TaskManager:
             task_file = self.archive_dir / f"CHANGE-{task_id}.json"
         
         if task_file.exists():
-            with open(task_file) as f:
-                return json.load(f)
+            with open(task_file, "rb") as f:
+                return loads(f.read())
         
         return None
     
+    async def get_task_async(self, task_id: str) -> Optional[dict]:
+        """
+        get_task() run on the I/O pool, for use from async handlers
+        """
+        return await run_io(self.get_task, task_id)
+    
     def update_task_status(
         self,
         task_id: str,
@@ -114,8 +331,8 @@ class TaskManager:
         if not task_file.exists():
             return False
         
-        with open(task_file) as f:
-            task = json.load(f)
+        with open(task_file, "rb") as f:
+            task = loads(f.read())
         
         task["status"] = status
         task["updated_at"] = datetime.utcnow().isoformat() + "Z"
@@ -125,15 +342,22 @@ class TaskManager:
             "data": result
         }
         
-        with open(task_file, "w") as f:
-            json.dump(task, f, indent=2)
+        write_json_atomic(task_file, task, self.durability, self.codec)
         
         # Archive completed tasks
         if status in ["success", "failed", "manual_review"]:
-            self._archive_task(task_file)
+            self._archive_task(task_file, task)
+        else:
+            self.index.upsert(task, stat=task_file.stat())
         
         return True
     
+    async def update_task_status_async(self, *args, **kwargs) -> bool:
+        """
+        update_task_status() run on the I/O pool, for use from async handlers
+        """
+        return await run_io(self.update_task_status, *args, **kwargs)
+    
     def delete_task(self, task_id: str) -> bool:
         """
         Delete a task file
@@ -142,18 +366,112 @@ class TaskManager:
         
         if task_file.exists():
             task_file.unlink()
+            self.index.remove(task_id)
             return True
         
         return False
     
-    def _archive_task(self, task_file: Path):
+    async def delete_task_async(self, task_id: str) -> bool:
+        """
+        delete_task() run on the I/O pool, for use from async handlers
+        """
+        return await run_io(self.delete_task, task_id)
+    
+    def _archive_task(self, task_file: Path, task: dict):
         """
         Move a completed task to the archive
         """
         archive_file = self.archive_dir / task_file.name
         task_file.rename(archive_file)
+        if self.durability == "fsync-dir":
+            fsync_dir(self.archive_dir)
+            fsync_dir(self.tasks_dir)
+        self.index.upsert(task, archived=True)
         print(f"Archived task: {archive_file}")
     
+    def _watch(self):
+        """
+        Mark task files dirty on change events so listings only re-read those
+        Returns the observer, or None if watchdog isn't installed
+        """
+        if Observer is None:
+            return None
+
+        manager = self
+
+        class TaskFileHandler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.is_directory or event.event_type not in TASK_FILE_EVENTS:
+                    return
+                for path in (event.src_path, getattr(event, "dest_path", "")):
+                    name = os.path.basename(path)
+                    if name.startswith("CHANGE-") and name.endswith(".json"):
+                        with manager._dirty_lock:
+                            manager._dirty.add(name[len("CHANGE-"):-len(".json")])
+
+        observer = Observer()
+        observer.schedule(TaskFileHandler(), str(self.tasks_dir), recursive=False)
+        observer.daemon = True
+        observer.start()
+        return observer
+
+    def close(self):
+        """Stop following change events"""
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+
+    def _sync_index(self, full: bool = False):
+        """
+        Reconcile the index with files added, removed or rewritten by other writers
+
+        With watchdog only the files named by change events are looked at.
+        Otherwise (and at startup) every task file is stat'ed and only those
+        whose (mtime_ns, size) differs from their row are parsed.
+        """
+        if self._observer is not None and not full:
+            with self._dirty_lock:
+                dirty, self._dirty = self._dirty, set()
+            for task_id in dirty:
+                try:
+                    stat = (self.tasks_dir / f"CHANGE-{task_id}.json").stat()
+                except FileNotFoundError:
+                    self.index.remove(task_id)
+                    continue
+                self._reindex(task_id, stat)
+            return
+
+        on_disk = {}
+        with os.scandir(self.tasks_dir) as entries:
+            for entry in entries:
+                if entry.name.startswith("CHANGE-") and entry.name.endswith(".json"):
+                    try:
+                        on_disk[entry.name[len("CHANGE-"):-len(".json")]] = entry.stat()
+                    except FileNotFoundError:
+                        continue  # archived or deleted since the listing
+        indexed = self.index.active_stats()
+        
+        for task_id in indexed.keys() - on_disk.keys():
+            self.index.remove(task_id)
+        
+        for task_id, stat in on_disk.items():
+            if indexed.get(task_id) != (stat.st_mtime_ns, stat.st_size):
+                self._reindex(task_id, stat)
+    
+    def _reindex(self, task_id: str, stat: os.stat_result):
+        task_file = self.tasks_dir / f"CHANGE-{task_id}.json"
+        try:
+            with open(task_file, "rb") as f:
+                task = loads(f.read())
+            task.setdefault("id", task_id)
+            self.index.upsert(task, stat=stat)
+        except (DecodeError, IOError) as e:
+            print(f"Error reading task file {task_file}: {e}")
+            # Likely mid-write: look again on the next sync
+            with self._dirty_lock:
+                self._dirty.add(task_id)
+    
     def get_pending_tasks(self) -> list[dict]:
         """
         Get all pending tasks
@@ -0,0 +1,147 @@
+"""
+Text Index - Inverted index (token -> file, line) over the target repo
+Finds the files and line ranges that contain a phrase, e.g. existing copy to replace
+"""
+
+import re
+import threading
+from pathlib import Path
+from typing import Optional
+
+TOKEN_RE = re.compile(r"[^\W_]+")
+WHITESPACE_RE = re.compile(r"\s+")
+
+# Markup between words ("Ad <b>directors</b>") shouldn't break a phrase match
+TAG_RE = re.compile(r"<[^<>]*>")
+
+# Lines around a hit searched for the full phrase (JSX text often wraps)
+CONTEXT_LINES = 2
+
+# Candidate lines verified per query; the rarest token bounds the work
+MAX_CANDIDATES = 200
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_RE.findall(text.casefold())
+
+
+def normalize(text: str) -> str:
+    return WHITESPACE_RE.sub(" ", TAG_RE.sub(" ", text)).casefold().strip()
+
+
+class TextIndex:
+    """
+    Token -> {file: [line numbers]} postings with a per-file reverse map
+
+    Files are added and removed one at a time, so the ScopeResolver's
+    change events keep it current without rescanning. A phrase query
+    intersects the postings of its tokens, starting from the rarest, and
+    confirms the surviving lines against the file text.
+    """
+
+    def __init__(self, repo_path: str):
+        self.repo_path = Path(repo_path)
+        self._postings: dict[str, dict[str, list[int]]] = {}
+        self._file_tokens: dict[str, set[str]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def token_count(self) -> int:
+        return len(self._postings)
+
+    def add(self, rel_path: str, source: str):
+        lines: dict[str, list[int]] = {}
+        for number, line in enumerate(source.casefold().splitlines(), start=1):
+            for token in TOKEN_RE.findall(line):
+                numbers = lines.get(token)
+                if numbers is None:
+                    lines[token] = [number]
+                elif numbers[-1] != number:
+                    numbers.append(number)
+
+        with self._lock:
+            self._remove(rel_path)
+            postings = self._postings
+            for token, numbers in lines.items():
+                files = postings.get(token)
+                if files is None:
+                    postings[token] = {rel_path: numbers}
+                else:
+                    files[rel_path] = numbers
+            self._file_tokens[rel_path] = set(lines)
+
+    def remove(self, rel_path: str):
+        with self._lock:
+            self._remove(rel_path)
+
+    def clear(self):
+        with self._lock:
+            self._postings.clear()
+            self._file_tokens.clear()
+
+    def find(self, phrase: str, limit: int = 5) -> list[dict]:
+        """
+        Locations of a phrase as [{"file": path, "lines": [start, end]}]
+        Matching ignores case, whitespace and inline tags/expressions
+        """
+        tokens = list(dict.fromkeys(tokenize(phrase)))
+        target = " ".join(tokenize(phrase))
+        if not tokens:
+            return []
+
+        with self._lock:
+            postings = [self._postings.get(token) for token in tokens]
+            if not all(postings):
+                return []
+            postings.sort(key=len)
+
+            # Files containing every token, then lines near the rarest one
+            files = set(postings[0]).intersection(*postings[1:])
+            candidates = []
+            budget = MAX_CANDIDATES
+            for rel_path in sorted(files):
+                if budget <= 0:
+                    break
+                numbers = postings[0][rel_path][:budget]
+                candidates.append((rel_path, numbers))
+                budget -= len(numbers)
+
+        results = []
+        for rel_path, numbers in candidates:
+            lines = self._read_lines(rel_path)
+            if lines is None:
+                continue
+
+            spans = {self._match_span(lines, number, target) for number in numbers} - {None}
+            # One hit is found from every candidate line near it; keep the innermost window
+            for span in sorted(spans):
+                if not any(other != span and span[0] <= other[0] and other[1] <= span[1] for other in spans):
+                    results.append({"file": rel_path, "lines": list(span)})
+            if len(results) >= limit:
+                break
+        return results[:limit]
+
+    def _match_span(self, lines: list[str], number: int, target: str) -> Optional[tuple[int, int]]:
+        """Smallest window of lines around `number` whose text contains the phrase"""
+        first = max(1, number - CONTEXT_LINES)
+        last = min(len(lines), number + CONTEXT_LINES)
+        for size in range(1, last - first + 2):
+            for start in range(max(first, number - size + 1), min(number, last - size + 1) + 1):
+                text = " ".join(tokenize(normalize(" ".join(lines[start - 1:start - 1 + size]))))
+                if f" {target} " in f" {text} ":
+                    return (start, start + size - 1)
+        return None
+
+    def _read_lines(self, rel_path: str) -> Optional[list[str]]:
+        try:
+            return (self.repo_path / rel_path).read_text(encoding="utf-8", errors="ignore").splitlines()
+        except OSError:
+            return None
+
+    def _remove(self, rel_path: str):
+        for token in self._file_tokens.pop(rel_path, ()):
+            files = self._postings.get(token)
+            if files is not None:
+                files.pop(rel_path, None)
+                if not files:
+                    del self._postings[token]
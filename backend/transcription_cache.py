@@ -0,0 +1,120 @@
+"""
+Transcription Cache - Content-addressed store of voice note transcriptions
+Keyed by the SHA-256 of the audio bytes so redelivered or forwarded notes skip Whisper
+"""
+
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional
+
+from io_pool import run_io
+
+
+class TranscriptionCache:
+    """
+    SQLite-backed cache with least-recently-used eviction by total text size
+    Async handlers use get_async/put_async so commits stay off the event loop
+    """
+    
+    def __init__(self, db_path: str, max_bytes: int = 10 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS transcriptions (
+                digest TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_transcriptions_last_used
+                ON transcriptions (last_used);
+        """)
+        
+        # Running total of stored text, so puts don't SUM the table
+        self._total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM transcriptions"
+        ).fetchone()[0]
+    
+    def get(self, digest: str) -> Optional[str]:
+        """Return the cached transcription for an audio hash"""
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT text FROM transcriptions WHERE digest = ?", (digest,)
+            ).fetchone()
+            
+            if row is None:
+                self.misses += 1
+                return None
+            
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE transcriptions SET last_used = ? WHERE digest = ?",
+                (time.time(), digest)
+            )
+            return row[0]
+    
+    def put(self, digest: str, text: str):
+        """Store a transcription and evict the oldest entries past max_bytes"""
+        size = len(text.encode("utf-8"))
+        with self._lock, self._conn:
+            replaced = self._conn.execute(
+                "SELECT size FROM transcriptions WHERE digest = ?", (digest,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO transcriptions (digest, text, size, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                (digest, text, size, time.time())
+            )
+            
+            self._total += size - (replaced[0] if replaced else 0)
+            if self._total <= self.max_bytes:
+                return
+            
+            total = self._total
+            for old_digest, old_size in self._conn.execute(
+                "SELECT digest, size FROM transcriptions ORDER BY last_used"
+            ).fetchall():
+                if total <= self.max_bytes:
+                    break
+                self._conn.execute(
+                    "DELETE FROM transcriptions WHERE digest = ?", (old_digest,)
+                )
+                total -= old_size
+                self.evictions += 1
+            self._total = total
+    
+    async def get_async(self, digest: str) -> Optional[str]:
+        """
+        get() run on the I/O pool, for use from async handlers
+        """
+        return await run_io(self.get, digest)
+    
+    async def put_async(self, digest: str, text: str):
+        """
+        put() run on the I/O pool, for use from async handlers
+        """
+        return await run_io(self.put, digest, text)
+    
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM transcriptions"
+            ).fetchone()
+        return {
+            "entries": entries,
+            "bytes": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
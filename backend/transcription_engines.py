@@ -0,0 +1,140 @@
+"""
+Transcription Engines - Pluggable speech-to-text backends for VoiceTranscriber
+Remote OpenAI Whisper API or a local CPU model (faster-whisper, int8)
+"""
+
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO
+
+try:
+    import faster_whisper
+except ImportError:
+    faster_whisper = None
+
+
+class TranscriptionEngine:
+    """
+    Interface for speech-to-text engines
+    """
+    
+    name = "base"
+    
+    async def transcribe(self, audio_file: BinaryIO, content_type: str = "audio/ogg") -> str:
+        raise NotImplementedError
+    
+    def warm_up(self):
+        """Load models ahead of the first request, no-op by default"""
+    
+    def close(self):
+        """Release engine resources on shutdown"""
+
+
+class OpenAIWhisperEngine(TranscriptionEngine):
+    """
+    Remote whisper-1 through the OpenAI API
+    """
+    
+    name = "openai"
+    
+    # Whisper detects the format from the file extension
+    EXTENSIONS = {"audio/wav": "wav", "audio/x-wav": "wav", "audio/mpeg": "mp3", "audio/mp4": "m4a"}
+    
+    def __init__(self, client):
+        self.client = client
+    
+    async def transcribe(self, audio_file: BinaryIO, content_type: str = "audio/ogg") -> str:
+        extension = self.EXTENSIONS.get(content_type.split(";")[0], "ogg")
+        transcription = await self.client.audio.transcriptions.create(
+            model="whisper-1",
+            file=(f"voice.{extension}", audio_file, content_type),
+            response_format="text"
+        )
+        return transcription.strip()
+
+
+# Per-process model, loaded once by the pool initializer and kept warm
+_worker_model = None
+
+
+def _init_worker(model_size: str, compute_type: str, cpu_threads: int):
+    global _worker_model
+    _worker_model = faster_whisper.WhisperModel(
+        model_size,
+        device="cpu",
+        compute_type=compute_type,
+        cpu_threads=cpu_threads
+    )
+
+
+def _transcribe_in_worker(audio: bytes) -> str:
+    import io
+    
+    segments, _ = _worker_model.transcribe(io.BytesIO(audio), vad_filter=True)
+    return " ".join(segment.text.strip() for segment in segments).strip()
+
+
+def _ping() -> bool:
+    return _worker_model is not None
+
+
+class LocalWhisperEngine(TranscriptionEngine):
+    """
+    Local CPU inference with faster-whisper in a process pool
+    Each worker process loads the quantized model once and keeps it in memory
+    """
+    
+    name = "local"
+    
+    def __init__(
+        self,
+        model_size: str = "base",
+        compute_type: str = "int8",
+        workers: int = 1,
+        cpu_threads: int = 4
+    ):
+        if faster_whisper is None:
+            raise RuntimeError("TRANSCRIPTION_ENGINE=local requires the faster-whisper package")
+        
+        self.name = f"local-{model_size}-{compute_type}"
+        self.workers = workers
+        # spawn: don't fork the server's event loop and threads into workers
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_size, compute_type, cpu_threads)
+        )
+    
+    async def transcribe(self, audio_file: BinaryIO, content_type: str = "audio/ogg") -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, _transcribe_in_worker, audio_file.read())
+    
+    def warm_up(self):
+        # Starting every worker runs the initializer, which loads the model
+        for _ in range(self.workers):
+            self._pool.submit(_ping)
+    
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def create_engine(openai_client=None) -> TranscriptionEngine:
+    """
+    Build the engine selected by TRANSCRIPTION_ENGINE (openai / local)
+    Returns None if the OpenAI engine is selected without a client
+    """
+    kind = os.getenv("TRANSCRIPTION_ENGINE", "openai")
+    
+    if kind == "local":
+        return LocalWhisperEngine(
+            model_size=os.getenv("LOCAL_WHISPER_MODEL", "base"),
+            compute_type=os.getenv("LOCAL_WHISPER_COMPUTE_TYPE", "int8"),
+            workers=int(os.getenv("LOCAL_WHISPER_WORKERS", 1)),
+            cpu_threads=int(os.getenv("LOCAL_WHISPER_THREADS", 4))
+        )
+    if kind == "openai":
+        return OpenAIWhisperEngine(openai_client) if openai_client else None
+    raise ValueError(f"Unknown transcription engine: {kind}")
@@ -1,71 +1,90 @@
 """
-Voice Transcriber - Transcribes voice notes from WhatsApp using OpenAI Whisper
+Voice Transcriber - Transcribes voice notes from WhatsApp
+Uses OpenAI Whisper or a local model, see transcription_engines.py
 """
 
+import io
 import os
+import asyncio
+import hashlib
 import tempfile
 import httpx
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
 
+from http_clients import http_clients
+from transcription_cache import TranscriptionCache
+from transcription_engines import create_engine
+from audio_preprocessor import create_preprocessor
+
 load_dotenv()
 
+# Whisper rejects uploads over 25 MB
+MAX_VOICE_BYTES = int(os.getenv("VOICE_MAX_BYTES", 25 * 1024 * 1024))
+
+# Voice notes up to this size never touch the disk
+SPOOL_MAX_MEMORY = int(os.getenv("VOICE_SPOOL_MEMORY", 2 * 1024 * 1024))
+
+
+class VoiceNoteTooLarge(Exception):
+    """Raised when a voice note exceeds MAX_VOICE_BYTES"""
+
 
 class VoiceTranscriber:
     """
-    Transcribes voice messages using OpenAI's Whisper API
+    Transcribes voice messages with the configured transcription engine
     """
     
     def __init__(self):
         api_key = os.getenv("OPENAI_API_KEY")
+        client = None
         if api_key:
-            self.client = AsyncOpenAI(api_key=api_key)
-        else:
-            self.client = None
+            client = AsyncOpenAI(api_key=api_key, http_client=http_clients.get("openai"))
+        
+        self.engine = create_engine(client)
+        if self.engine is None:
             print("Warning: OPENAI_API_KEY not set. Voice transcription disabled.")
         
+        # Decode / trim silence / chunk before transcription (needs ffmpeg)
+        self.preprocessor = create_preprocessor()
+        self.chunk_concurrency = int(os.getenv("AUDIO_CHUNK_CONCURRENCY", 4))
+        
         # Twilio auth for downloading media
         self.twilio_sid = os.getenv("TWILIO_ACCOUNT_SID")
         self.twilio_token = os.getenv("TWILIO_AUTH_TOKEN")
+        
+        # Transcriptions keyed by audio content hash
+        self.cache = TranscriptionCache(
+            os.getenv("TRANSCRIPTION_CACHE_PATH", "../data/transcriptions.db"),
+            max_bytes=int(os.getenv("TRANSCRIPTION_CACHE_BYTES", 10 * 1024 * 1024))
+        )
     
     async def transcribe_from_url(self, media_url: str) -> str:
         """
         Download audio from URL and transcribe it
         """
-        if not self.client:
+        if not self.engine:
             return "[Voice transcription unavailable - OPENAI_API_KEY not set]"
         
         try:
-            # Download the audio file from Twilio
-            async with httpx.AsyncClient() as client:
-                # Twilio requires auth to download media
-                response = await client.get(
-                    media_url,
-                    auth=(self.twilio_sid, self.twilio_token) if self.twilio_sid else None,
-                    follow_redirects=True
-                )
-                response.raise_for_status()
-                audio_data = response.content
+            audio_file, content_type, digest = await self._download(media_url)
             
-            # Save to temporary file
-            with tempfile.NamedTemporaryFile(suffix=".ogg", delete=False) as tmp_file:
-                tmp_file.write(audio_data)
-                tmp_path = tmp_file.name
+            # Different engines give different text for the same audio
+            cache_key = f"{self.engine.name}:{digest}"
             
-            try:
-                # Transcribe using Whisper
-                with open(tmp_path, "rb") as audio_file:
-                    transcription = await self.client.audio.transcriptions.create(
-                        model="whisper-1",
-                        file=audio_file,
-                        response_format="text"
-                    )
+            with audio_file:
+                cached = await self.cache.get_async(cache_key)
+                if cached is not None:
+                    return cached
                 
-                return transcription.strip()
-            finally:
-                # Clean up temp file
-                os.unlink(tmp_path)
+                transcription = await self._transcribe_audio(audio_file, content_type)
+            
+            await self.cache.put_async(cache_key, transcription)
+            return transcription
                 
+        except VoiceNoteTooLarge as e:
+            print(f"Voice note rejected: {e}")
+            return "[Voice note too long to transcribe]"
         except httpx.HTTPError as e:
             print(f"Error downloading audio: {e}")
             return "[Error downloading voice note]"
@@ -73,22 +92,77 @@ class VoiceTranscriber:
             print(f"Error transcribing audio: {e}")
             return "[Error transcribing voice note]"
     
+    async def _transcribe_audio(self, audio_file, content_type: str) -> str:
+        """
+        Transcribe preprocessed chunks in parallel and stitch them in order
+        Falls back to uploading the original audio if preprocessing fails
+        """
+        if self.preprocessor:
+            chunks = await self.preprocessor.process(audio_file)
+            if chunks is not None:
+                semaphore = asyncio.Semaphore(self.chunk_concurrency)
+                
+                async def transcribe_chunk(chunk: memoryview) -> str:
+                    # Encoded inside the semaphore so only chunks in flight are held as WAV
+                    async with semaphore:
+                        wav = await self.preprocessor.encode(chunk)
+                        return await self.engine.transcribe(io.BytesIO(wav), "audio/wav")
+                
+                texts = await asyncio.gather(*(transcribe_chunk(chunk) for chunk in chunks))
+                return " ".join(text for text in texts if text)
+            
+            audio_file.seek(0)
+        
+        # Transcribe straight from the spooled buffer
+        return await self.engine.transcribe(audio_file, content_type)
+    
+    async def _download(self, media_url: str) -> tuple[tempfile.SpooledTemporaryFile, str, str]:
+        """
+        Stream Twilio media into a spooled buffer, hashing it on the way
+        Stays in memory up to SPOOL_MAX_MEMORY and aborts past MAX_VOICE_BYTES
+        Returns (audio file, content type, sha256 hex digest)
+        """
+        # Twilio requires auth to download media
+        async with http_clients.get("twilio").stream(
+            "GET",
+            media_url,
+            auth=(self.twilio_sid, self.twilio_token) if self.twilio_sid else None,
+            follow_redirects=True
+        ) as response:
+            response.raise_for_status()
+            
+            declared = int(response.headers.get("content-length", 0))
+            if declared > MAX_VOICE_BYTES:
+                raise VoiceNoteTooLarge(f"{declared} bytes (limit {MAX_VOICE_BYTES})")
+            
+            audio_file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+            digest = hashlib.sha256()
+            try:
+                size = 0
+                async for chunk in response.aiter_bytes():
+                    size += len(chunk)
+                    if size > MAX_VOICE_BYTES:
+                        raise VoiceNoteTooLarge(f"over {MAX_VOICE_BYTES} bytes")
+                    digest.update(chunk)
+                    audio_file.write(chunk)
+            except BaseException:
+                audio_file.close()
+                raise
+            
+            audio_file.seek(0)
+            content_type = response.headers.get("content-type", "audio/ogg")
+            return audio_file, content_type, digest.hexdigest()
+    
     async def transcribe_file(self, file_path: str) -> str:
         """
         Transcribe an audio file from local path
         """
-        if not self.client:
+        if not self.engine:
             return "[Voice transcription unavailable]"
         
         try:
             with open(file_path, "rb") as audio_file:
-                transcription = await self.client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file,
-                    response_format="text"
-                )
-            
-            return transcription.strip()
+                return await self.engine.transcribe(audio_file)
         except Exception as e:
             print(f"Error transcribing audio: {e}")
             return "[Error transcribing audio]"
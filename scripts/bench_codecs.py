@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+JSON Codec Benchmark
+Compares bytes written and encode/decode time per task for each codec
+
+Usage: python scripts/bench_codecs.py [iterations]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from json_codec import CODECS  # noqa: E402
+
+SAMPLE_TASK = {
+    "id": "abc12345",
+    "type": "copy_change",
+    "description": "Change the hero button to say 'Book a Free Audit'",
+    "scope": ["app/components/Hero.tsx"],
+    "rules": [
+        "Do not change layout structure",
+        "Do not remove existing functionality",
+        "Preserve all existing imports",
+        "Only modify text content",
+        "Do not touch styles or classes",
+        "Keep the same element types"
+    ],
+    "auto_commit": True,
+    "status": "pending",
+    "created_at": "2026-01-20T10:00:00Z",
+    "source": {
+        "message": "Change the hero button to say Book a Free Audit",
+        "sender": "whatsapp:+1234567890",
+        "timestamp": "2026-01-20T10:00:00Z"
+    },
+    "result": None
+}
+
+
+def bench(codec, iterations: int) -> tuple[int, float, float]:
+    """Returns (bytes, encode µs/task, decode µs/task)"""
+    encoded = codec.encode(SAMPLE_TASK)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        codec.encode(SAMPLE_TASK)
+    encode_us = (time.perf_counter() - start) / iterations * 1e6
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        codec.decode(encoded)
+    decode_us = (time.perf_counter() - start) / iterations * 1e6
+
+    return len(encoded), encode_us, decode_us
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    print(f"{'codec':<10} {'bytes':>7} {'encode µs':>10} {'decode µs':>10}")
+    for name, codec in CODECS.items():
+        size, encode_us, decode_us = bench(codec, iterations)
+        print(f"{name:<10} {size:>7} {encode_us:>10.2f} {decode_us:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
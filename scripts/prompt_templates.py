@@ -0,0 +1,170 @@
+"""
+Prompt Templates - Copilot prompts rendered from the shared template spec
+The VS Code extension renders the same spec (vscode-extension/src/promptTemplates.ts)
+
+Constant sections are rendered once per task type. Rendered prompts are
+cached by a hash of the task fields they use, and trimmed to a token
+budget by dropping low-priority list items before shortening text.
+"""
+
+import json
+import math
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+DEFAULT_SPEC_PATH = Path(__file__).resolve().parent.parent / "vscode-extension" / "src" / "promptTemplates.json"
+
+# Rendered prompts kept per process
+CACHE_SIZE = 256
+
+# Task fields a prompt can depend on; the cache key hashes exactly these
+PROMPT_FIELDS = ("type", "description", "scope", "rules", "locations")
+
+
+def clean(value) -> str:
+    return "" if value is None else str(value).replace("\r\n", "\n").strip()
+
+
+def content_hash(task: dict) -> str:
+    fields = {field: task.get(field) for field in PROMPT_FIELDS}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def annotate_locations(files: list[str], locations: list[dict]) -> list[str]:
+    """Append the pinned line ranges to each file, e.g. "Hero.tsx (lines 4-5)" """
+    ranges = {}
+    for location in locations or []:
+        start, end = location["lines"]
+        ranges.setdefault(location["file"], []).append(f"line {start}" if start == end else f"lines {start}-{end}")
+    return [f"{f} ({', '.join(ranges[f])})" if f in ranges else f for f in files]
+
+
+class PromptTemplates:
+    """
+    Renders tasks with the template spec
+
+    A spec is a list of sections, each one of:
+      {"text": ...}                   a literal paragraph
+      {"title": ..., "lines": [...]}  a literal "## title" block
+      {"title": ..., "field": ...}    a task field
+      {"title": ..., "list": ...}     a task list, one "- item" per line
+    Sections with "trim" give up content, lowest priority first, when the
+    prompt is over maxTokens. Lists drop items from the end unless "from" is
+    "start" (rules list generic ones before task-specific ones). "types"
+    overrides sections per task type.
+    """
+
+    def __init__(self, spec: dict, max_tokens: int = None):
+        self.spec = spec
+        self.max_tokens = max_tokens or spec["maxTokens"]
+        self.chars_per_token = spec["charsPerToken"]
+        self._compiled: dict[str, list] = {}
+        self._cache: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str = None, max_tokens: int = None) -> "PromptTemplates":
+        spec_path = Path(path) if path else DEFAULT_SPEC_PATH
+        with open(spec_path, encoding="utf-8") as f:
+            return cls(json.load(f), max_tokens)
+
+    def estimate_tokens(self, text: str) -> int:
+        return math.ceil(len(text) / self.chars_per_token)
+
+    def render(self, task: dict) -> str:
+        key = content_hash(task)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        prompt = self._render(task)
+
+        with self._lock:
+            self._cache[key] = prompt
+            while len(self._cache) > CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return prompt
+
+    def compile(self, task_type: str) -> list:
+        """
+        Sections for a task type: literal sections become strings, the rest
+        stay as section dicts to be filled per task
+        """
+        with self._lock:
+            if task_type in self._compiled:
+                return self._compiled[task_type]
+
+        overrides = self.spec.get("types", {}).get(task_type, {})
+        compiled = []
+        for section in self.spec["sections"]:
+            section = {**section, **overrides.get(section.get("id"), {})}
+            if "text" in section:
+                compiled.append(section["text"])
+            elif "lines" in section:
+                compiled.append(f"## {section['title']}\n" + "\n".join(section["lines"]))
+            else:
+                compiled.append(section)
+
+        with self._lock:
+            self._compiled[task_type] = compiled
+        return compiled
+
+    def _render(self, task: dict) -> str:
+        sections = self.compile(task.get("type", ""))
+        fields = {}
+        lists = {}
+        for section in sections:
+            if isinstance(section, dict) and "field" in section:
+                fields[section["field"]] = clean(task.get(section["field"], ""))
+            elif isinstance(section, dict):
+                items = [clean(item) for item in task.get(section["list"]) or []]
+                lists[section["list"]] = list(dict.fromkeys(item for item in items if item))
+        omitted = {}
+
+        prompt = self._assemble(sections, task, fields, lists, omitted)
+        if self.estimate_tokens(prompt) <= self.max_tokens:
+            return prompt
+
+        trimmable = sorted(
+            (s for s in sections if isinstance(s, dict) and "trim" in s),
+            key=lambda s: s["trim"]["priority"]
+        )
+        for section in trimmable:
+            if "list" in section:
+                items = lists[section["list"]]
+                while len(items) > section["trim"].get("minItems", 0) and self.estimate_tokens(prompt) > self.max_tokens:
+                    items.pop(0 if section["trim"].get("from") == "start" else -1)
+                    omitted[section["list"]] = omitted.get(section["list"], 0) + 1
+                    prompt = self._assemble(sections, task, fields, lists, omitted)
+            else:
+                value = fields[section["field"]]
+                overflow = len(prompt) - self.max_tokens * self.chars_per_token
+                keep = max(section["trim"].get("minChars", 0), len(value) - overflow - 1)
+                if overflow > 0 and keep < len(value):
+                    fields[section["field"]] = value[:keep].rstrip() + "…"
+                    prompt = self._assemble(sections, task, fields, lists, omitted)
+
+            if self.estimate_tokens(prompt) <= self.max_tokens:
+                break
+
+        return prompt
+
+    def _assemble(self, sections: list, task: dict, fields: dict, lists: dict, omitted: dict) -> str:
+        parts = []
+        for section in sections:
+            if isinstance(section, str):
+                parts.append(section)
+            elif "field" in section:
+                parts.append(f"## {section['title']}\n{fields[section['field']]}")
+            else:
+                items = lists[section["list"]]
+                if "annotate" in section:
+                    items = annotate_locations(items, task.get(section["annotate"]))
+                lines = [f"- {item}" for item in items]
+                if omitted.get(section["list"]):
+                    lines.append(self.spec["omittedItem"].replace("{count}", str(omitted[section["list"]])))
+                parts.append(f"## {section['title']}\n" + "\n".join(lines))
+        return "\n\n".join(parts)
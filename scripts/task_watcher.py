@@ -5,66 +5,201 @@ Alternative to the VS Code extension for simpler setups
 
 This script watches for CHANGE.json files and opens them in VS Code
 with a pre-formatted Copilot prompt copied to clipboard.
+
+Tasks are prepared by a worker pool and then wait for review, so one
+unreviewed task doesn't hold up the others. Reviews go through a small
+local control API:
+
+    python task_watcher.py review list
+    python task_watcher.py review copy <task_id>
+    python task_watcher.py review <task_id> y|n|m [--commit]
+    python task_watcher.py review git
+
+Install requirements.txt alongside it for event-driven watching.
 """
 
 import os
 import sys
 import json
 import time
+import queue
+import sqlite3
+import threading
 import subprocess
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 from datetime import datetime
+from typing import Iterator
+
+from prompt_templates import PromptTemplates
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+
+try:
+    import pygit2
+except ImportError:
+    pygit2 = None
 
 # Configuration
 TASKS_DIR = os.environ.get("TASKS_DIR", "./tasks")
-POLL_INTERVAL = 2  # seconds
+POLL_INTERVAL = 2  # seconds, only used by the polling fallback
+WATCHER_BACKEND = os.environ.get("WATCHER_BACKEND", "auto")  # auto / watchdog / poll
+READ_RETRY_DELAY = 1  # seconds before re-reading a task file that was still being written
+READ_RETRIES = 5  # then wait for the file's next change event
 TARGET_REPO = os.environ.get("TARGET_REPO", ".")
+TASK_DURABILITY = os.environ.get("TASK_DURABILITY", "none")  # none / fsync-file / fsync-dir
+WATCHER_WORKERS = int(os.environ.get("WATCHER_WORKERS", 4))
+CONTROL_PORT = int(os.environ.get("WATCHER_CONTROL_PORT", 8765))
+LEDGER_SIZE = int(os.environ.get("WATCHER_LEDGER_SIZE", 10000))  # finished tasks remembered
+COMMIT_WINDOW = float(os.environ.get("WATCHER_COMMIT_WINDOW", 10))  # seconds to gather auto-commits
+GIT_BACKEND = os.environ.get("WATCHER_GIT_BACKEND", "auto")  # auto / pygit2 / cli
+PROMPT_TEMPLATES = os.environ.get("WATCHER_PROMPT_TEMPLATES")  # defaults to the extension's promptTemplates.json
+PROMPT_MAX_TOKENS = int(os.environ.get("WATCHER_PROMPT_MAX_TOKENS", 0)) or None  # defaults to the spec's maxTokens
+
+# Review answers accepted by the control API and CLI
+DECISIONS = {"y": "success", "n": "failed", "m": "manual_review"}
 
-processed_tasks = set()
+ledger = None  # TaskLedger, opened in watch_tasks
 
+# Prepared tasks waiting for a human: task_id -> {"path", "task", "prompt", "since"}
+pending_reviews = {}
+reviews_lock = threading.Lock()
 
-def load_processed_tasks():
-    """Load list of already processed tasks"""
-    processed_file = Path(TASKS_DIR) / ".processed"
-    if processed_file.exists():
-        return set(processed_file.read_text().strip().split("\n"))
-    return set()
+git_worker = None  # GitWorker, created in watch_tasks
+prompt_templates = None  # PromptTemplates, loaded on first use
+commit_batcher = None  # CommitBatcher, created in watch_tasks
 
 
-def save_processed_task(task_id: str):
-    """Save task as processed"""
-    processed_file = Path(TASKS_DIR) / ".processed"
-    with open(processed_file, "a") as f:
-        f.write(f"{task_id}\n")
+class TaskLedger:
+    """
+    SQLite record of every task the watcher has picked up
+    
+    Replaces the append-only .processed file. Membership is a primary key
+    lookup and only the newest LEDGER_SIZE finished tasks are kept, so
+    startup cost doesn't grow with history.
+    """
+    
+    # Statuses that end a task's life in the watcher
+    FINISHED = ("skipped", "success", "failed", "manual_review")
+    
+    # Prune every this many claims rather than on each insert
+    PRUNE_EVERY = 100
+    
+    def __init__(self, db_path: Path, max_entries: int = LEDGER_SIZE):
+        self.max_entries = max_entries
+        self._claims = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS ledger (
+                task_id TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                status TEXT NOT NULL,
+                claimed_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_ledger_status_updated
+                ON ledger (status, updated_at);
+        """)
+        
+        # Claimed but never prepared: the watcher stopped before a worker ran
+        with self._conn:
+            self._conn.execute("DELETE FROM ledger WHERE status = 'queued'")
+        
+        self._import_processed_file(db_path.parent / ".processed")
+        self.prune()
+    
+    def claim(self, task_id: str, task_path: Path) -> bool:
+        """Record a newly seen task; False if it was already in the ledger"""
+        now = datetime.utcnow().isoformat() + "Z"
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO ledger (task_id, path, status, claimed_at, updated_at) "
+                "VALUES (?, ?, 'queued', ?, ?)",
+                (task_id, str(task_path.resolve()), now, now)
+            )
+            self._claims += 1
+        
+        if self._claims % self.PRUNE_EVERY == 0:
+            self.prune()
+        return cursor.rowcount == 1
+    
+    def release(self, task_id: str):
+        """Forget a claim so the task file is picked up again when next seen"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM ledger WHERE task_id = ?", (task_id,))
+    
+    def set_status(self, task_id: str, status: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE ledger SET status = ?, updated_at = ? WHERE task_id = ?",
+                (status, datetime.utcnow().isoformat() + "Z", task_id)
+            )
+    
+    def get(self, task_id: str) -> dict:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT task_id, path, status, claimed_at, updated_at FROM ledger WHERE task_id = ?",
+                (task_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("task_id", "path", "status", "claimed_at", "updated_at"), row))
+    
+    def with_status(self, status: str) -> list[tuple[str, Path]]:
+        """(task_id, path) for every task currently in status"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT task_id, path FROM ledger WHERE status = ? ORDER BY claimed_at",
+                (status,)
+            ).fetchall()
+        return [(task_id, Path(path)) for task_id, path in rows]
+    
+    def prune(self):
+        """Forget the oldest finished tasks beyond max_entries"""
+        placeholders = ", ".join("?" * len(self.FINISHED))
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"DELETE FROM ledger WHERE task_id IN ("
+                f"SELECT task_id FROM ledger WHERE status IN ({placeholders}) "
+                f"ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (*self.FINISHED, self.max_entries)
+            )
+    
+    def _import_processed_file(self, processed_file: Path):
+        """One-time migration from the old newline-separated .processed file"""
+        if not processed_file.exists():
+            return
+        
+        now = datetime.utcnow().isoformat() + "Z"
+        task_ids = [line for line in processed_file.read_text().split("\n") if line]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO ledger (task_id, path, status, claimed_at, updated_at) "
+                "VALUES (?, ?, 'success', ?, ?)",
+                [
+                    (task_id, str(processed_file.parent.resolve() / f"CHANGE-{task_id}.json"), now, now)
+                    for task_id in task_ids
+                ]
+            )
+        processed_file.rename(processed_file.with_name(".processed.migrated"))
+        print(f"📒 Imported {len(task_ids)} tasks from {processed_file.name}")
 
 
 def build_copilot_prompt(task: dict) -> str:
     """Build the Copilot prompt from task"""
-    scope_list = "\n".join(f"- {f}" for f in task["scope"])
-    rules_list = "\n".join(f"- {r}" for r in task.get("rules", []))
-
-    return f"""Apply the following change strictly:
-
-## Task Type
-{task["type"]}
-
-## Description
-{task["description"]}
-
-## Target Files (ONLY modify these)
-{scope_list}
-
-## Rules (MUST follow)
-{rules_list}
-
-## Important
-- Make ONLY the requested change
-- Do NOT modify any other code
-- Do NOT change layout or structure unless explicitly requested
-- Preserve all existing functionality
-- Keep the same code style and formatting
-
-Please apply this change now."""
+    global prompt_templates
+    if prompt_templates is None:
+        prompt_templates = PromptTemplates.load(PROMPT_TEMPLATES, PROMPT_MAX_TOKENS)
+    return prompt_templates.render(task)
 
 
 def copy_to_clipboard(text: str):
@@ -103,127 +238,583 @@ def update_task_status(task_path: Path, status: str, details: str = ""):
         "updated_at": datetime.utcnow().isoformat() + "Z"
     }
     
-    with open(task_path, "w") as f:
+    # Write to a temp file and rename so readers never see a torn file
+    tmp_path = task_path.with_name(f".{task_path.name}.tmp")
+    with open(tmp_path, "w") as f:
         json.dump(task, f, indent=2)
+        if TASK_DURABILITY != "none":
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, task_path)
+    
+    if TASK_DURABILITY == "fsync-dir":
+        fd = os.open(task_path.parent, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
 
 
-def process_task(task_path: Path):
-    """Process a single task file"""
-    print(f"\n📋 Processing: {task_path.name}")
-    
-    with open(task_path) as f:
-        task = json.load(f)
+class TaskNotReady(Exception):
+    """A task file couldn't be read, e.g. its writer hasn't finished yet"""
+
+
+def prepare_task(task_path: Path):
+    """
+    Prepare a task for review: mark it processing, build the prompt, open files
+    Runs on the worker pool and returns without waiting for the reviewer
+    """
+    try:
+        with open(task_path) as f:
+            task = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise TaskNotReady(f"{task_path.name}: {e}") from e
     
     # Skip non-pending tasks
     if task.get("status") != "pending":
-        print(f"  ⏭️  Skipping (status: {task.get('status')})")
+        print(f"  ⏭️  Skipping {task_path.name} (status: {task.get('status')})")
+        ledger.set_status(task["id"], "skipped")
         return
     
+    # Update status
+    update_task_status(task_path, "processing")
+    ledger.set_status(task["id"], "processing")
+    
+    # Open files in VS Code; the review doesn't depend on it
+    try:
+        open_in_vscode(task["scope"], TARGET_REPO)
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"  ⚠️  Could not open files in VS Code: {e}")
+    
+    register_review(task_path, task)
+
+
+def register_review(task_path: Path, task: dict):
+    """Build the task's prompt and queue it for review"""
+    prompt = build_copilot_prompt(task)
+    ledger.set_status(task["id"], "awaiting_review")
+    
+    with reviews_lock:
+        first_in_line = not pending_reviews
+        pending_reviews[task["id"]] = {
+            "path": task_path,
+            "task": task,
+            "prompt": prompt,
+            "since": datetime.utcnow().isoformat() + "Z"
+        }
+    
+    # Don't clobber the clipboard while another task is being reviewed
+    if first_in_line:
+        try:
+            copy_to_clipboard(prompt)
+        except OSError as e:
+            print(f"  ⚠️  Could not copy prompt to clipboard: {e}")
+            first_in_line = False
+    
+    print(f"\n📋 Ready for review: {task['id']}")
     print(f"  📝 {task['description']}")
     print(f"  🎯 Type: {task['type']}")
     print(f"  📁 Scope: {', '.join(task['scope'])}")
+    if first_in_line:
+        print("  📋 Copilot prompt copied to clipboard!")
+    else:
+        print(f"  📋 Copy the prompt with: review copy {task['id']}")
+    print(f"  ✅ Finish with: review {task['id']} y|n|m [--commit]")
+
+
+def complete_review(task_id: str, decision: str, commit: bool = False) -> dict:
+    """
+    Apply a reviewer's decision to a pending task
+    Commits are handed to the batcher so the reply doesn't wait for a push
+    """
+    status = DECISIONS.get(decision, decision)
+    if status not in DECISIONS.values():
+        raise ValueError(f"Unknown decision: {decision}")
     
-    # Update status
-    update_task_status(task_path, "processing")
+    with reviews_lock:
+        review = pending_reviews.pop(task_id, None)
+    if review is None:
+        raise KeyError(task_id)
     
-    # Build prompt and copy to clipboard
-    prompt = build_copilot_prompt(task)
-    copy_to_clipboard(prompt)
-    print("  📋 Copilot prompt copied to clipboard!")
-    
-    # Open files in VS Code
-    print("  🔓 Opening files in VS Code...")
-    open_in_vscode(task["scope"], TARGET_REPO)
-    
-    # Wait for user
-    print("\n" + "="*50)
-    print("📌 NEXT STEPS:")
-    print("1. Open Copilot Chat in VS Code (Cmd+Shift+I)")
-    print("2. Paste the prompt (Cmd+V)")
-    print("3. Review and apply changes")
-    print("4. Save the files")
-    print("="*50)
-    
-    # Mark as processed
-    processed_tasks.add(task["id"])
-    save_processed_task(task["id"])
-    
-    # Wait for user to mark complete
-    while True:
-        response = input("\n✅ Done? (y=success / n=failed / m=manual review): ").lower()
-        if response == "y":
-            update_task_status(task_path, "success", "Completed via watcher script")
-            print("  ✅ Task marked as success")
+    details = {
+        "success": "Completed via watcher script",
+        "failed": "Failed via watcher script",
+        "manual_review": "Requires manual review",
+    }[status]
+    update_task_status(review["path"], status, details)
+    ledger.set_status(task_id, status)
+    print(f"  {'✅' if status == 'success' else '⚠️ '} Task {task_id} marked as {status}")
+    
+    committing = status == "success" and commit and review["task"].get("auto_commit", False)
+    if committing:
+        commit_batcher.submit(review["task"])
+    
+    return {"task_id": task_id, "status": status, "committing": committing}
+
+
+class ControlHandler(BaseHTTPRequestHandler):
+    """
+    Local review API
+      GET  /reviews                 list tasks waiting for review
+      GET  /git/status              files changed in TARGET_REPO
+      POST /reviews/<id>            {"decision": "y|n|m", "commit": bool}
+      POST /reviews/<id>/copy       copy the task's prompt to the clipboard
+    """
+    
+    def do_GET(self):
+        if self.path.rstrip("/") == "/git/status":
+            try:
+                changed = git_worker.submit(git_worker.status).result()
+            except GitError as e:
+                return self._reply(500, {"error": str(e)})
+            return self._reply(200, {"backend": git_worker.backend, "changed": changed})
+        
+        if self.path.rstrip("/") != "/reviews":
+            return self._reply(404, {"error": "not found"})
+        
+        with reviews_lock:
+            reviews = [
+                {
+                    "id": task_id,
+                    "description": review["task"]["description"],
+                    "scope": review["task"]["scope"],
+                    "auto_commit": review["task"].get("auto_commit", False),
+                    "since": review["since"],
+                }
+                for task_id, review in pending_reviews.items()
+            ]
+        self._reply(200, {"reviews": reviews})
+    
+    def do_POST(self):
+        parts = self.path.strip("/").split("/")
+        if len(parts) < 2 or parts[0] != "reviews":
+            return self._reply(404, {"error": "not found"})
+        task_id = parts[1]
+        
+        try:
+            if parts[2:] == ["copy"]:
+                with reviews_lock:
+                    prompt = pending_reviews[task_id]["prompt"]
+                copy_to_clipboard(prompt)
+                return self._reply(200, {"task_id": task_id, "copied": True})
             
-            # Offer to commit
-            if task.get("auto_commit", False):
-                commit = input("🔄 Auto-commit? (y/n): ").lower()
-                if commit == "y":
-                    run_git_commit(task)
-            break
-        elif response == "n":
-            update_task_status(task_path, "failed", "Failed via watcher script")
-            print("  ❌ Task marked as failed")
-            break
-        elif response == "m":
-            update_task_status(task_path, "manual_review", "Requires manual review")
-            print("  ⚠️  Task marked for manual review")
-            break
-
-
-def run_git_commit(task: dict):
-    """Run git commit and push"""
-    print("  📤 Committing changes...")
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            result = complete_review(task_id, body.get("decision", ""), body.get("commit", False))
+            self._reply(200, result)
+        except KeyError:
+            self._reply(404, {"error": f"no pending review for {task_id}"})
+        except ValueError as e:
+            self._reply(400, {"error": str(e)})
+    
+    def _reply(self, code: int, payload: dict):
+        data = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+def start_control_server() -> ThreadingHTTPServer:
+    """Serve the review API on localhost in a background thread"""
+    server = ThreadingHTTPServer(("127.0.0.1", CONTROL_PORT), ControlHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def review_cli(args: list[str]):
+    """
+    Client for the review API
+    review list | review copy <id> | review <id> y|n|m [--commit] | review git
+    """
+    base_url = f"http://127.0.0.1:{CONTROL_PORT}/reviews"
+    
+    def call(url: str, payload: dict = None) -> dict:
+        data = json.dumps(payload).encode() if payload is not None else None
+        request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request) as response:
+                return json.load(response)
+        except urllib.error.HTTPError as e:
+            return json.load(e)
+    
+    if not args or args[0] == "list":
+        reviews = call(base_url)["reviews"]
+        if not reviews:
+            print("No tasks waiting for review")
+        for review in reviews:
+            commit_hint = " (auto-commit)" if review["auto_commit"] else ""
+            print(f"{review['id']}  {review['description']}{commit_hint}")
+            print(f"    📁 {', '.join(review['scope'])}")
+    elif args[0] == "git":
+        print(call(f"http://127.0.0.1:{CONTROL_PORT}/git/status"))
+    elif args[0] == "copy" and len(args) > 1:
+        print(call(f"{base_url}/{args[1]}/copy", {}))
+    elif len(args) > 1:
+        print(call(f"{base_url}/{args[0]}", {"decision": args[1], "commit": "--commit" in args}))
+    else:
+        print(review_cli.__doc__)
+
+
+class CommitBatcher:
+    """
+    Coalesces auto-commits approved within COMMIT_WINDOW into one commit and push
+    A burst of ten copy changes becomes one deploy instead of ten
+    """
+    
+    def __init__(self, window: float = COMMIT_WINDOW):
+        self.window = window
+        self._tasks = []
+        self._timer = None
+        self._lock = threading.Lock()
+    
+    def submit(self, task: dict):
+        """Add a task to the open batch, starting the window if it's the first"""
+        with self._lock:
+            self._tasks.append(task)
+            if self._timer is None:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+    
+    def flush(self):
+        """Hand the open batch to the git executor now"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            tasks, self._tasks = self._tasks, []
+        
+        if tasks:
+            git_worker.submit(run_git_commit, tasks)
+
+
+def commit_message(tasks: list[dict]) -> str:
+    if len(tasks) == 1:
+        task = tasks[0]
+        return f"🤖 Auto: {task['description']}\n\nTask ID: {task['id']}\nType: {task['type']}"
+    
+    lines = "\n".join(f"- {task['description']} ({task['type']}, {task['id']})" for task in tasks)
+    return f"🤖 Auto: {len(tasks)} changes\n\n{lines}"
+
+
+class GitError(Exception):
+    """A git operation in TARGET_REPO failed"""
+
+
+class GitWorker:
+    """
+    Single long-lived owner of TARGET_REPO
+    
+    Requests run one at a time on the worker's thread, so git operations
+    never overlap. With pygit2 installed the repository and its index stay
+    open between tasks and staging/committing happen in-process; otherwise
+    each operation runs the git CLI. Pushing always uses the CLI so the
+    user's credential helpers and SSH config apply, and so does committing
+    when the repo has commit hooks (husky, lint-staged), which pygit2
+    doesn't run.
+    """
+    
+    # Hooks `git commit` runs
+    COMMIT_HOOKS = ("pre-commit", "prepare-commit-msg", "commit-msg", "post-commit")
+    
+    def __init__(self, repo_path: str, backend: str = GIT_BACKEND):
+        if backend == "auto":
+            backend = "pygit2" if pygit2 is not None else "cli"
+        if backend == "pygit2" and pygit2 is None:
+            raise RuntimeError("WATCHER_GIT_BACKEND=pygit2 requires: pip install pygit2")
+        
+        self.repo_path = repo_path
+        self.backend = backend
+        self._repo = None  # opened lazily on the worker thread
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="git")
+    
+    def submit(self, func, *args):
+        """Queue func to run on the worker thread, returns a Future"""
+        return self._executor.submit(func, *args)
+    
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+    
+    # The methods below must run on the worker thread, i.e. via submit()
+    
+    def add(self, files: list[str]):
+        if self.backend == "cli":
+            return self._cli("add", "--", *files)
+        
+        index = self._open().index
+        try:
+            index.read(False)  # no-op unless the index changed on disk
+            for file in files:
+                index.add(file)
+            index.write()
+        except (pygit2.GitError, OSError, KeyError) as e:
+            raise GitError(f"add: {e}") from e
+    
+    def commit(self, message: str):
+        if self.backend == "cli" or self._has_commit_hooks():
+            return self._cli("commit", "-m", message)
+        
+        repo = self._open()
+        repo.index.read(False)
+        tree = repo.index.write_tree()
+        parents = [] if repo.head_is_unborn else [repo.head.target]
+        if parents and repo[parents[0]].tree_id == tree:
+            raise GitError("nothing to commit")
+        
+        try:
+            signature = repo.default_signature
+            repo.create_commit("HEAD", signature, signature, message, tree, parents)
+        except (pygit2.GitError, KeyError) as e:
+            raise GitError(f"commit: {e}") from e
+    
+    def status(self) -> list[str]:
+        """Paths with staged or unstaged changes"""
+        if self.backend == "cli":
+            output = self._cli("status", "--porcelain", "-z")
+            return [entry[3:] for entry in output.split("\0") if entry]
+        
+        return sorted(
+            path
+            for path, flags in self._open().status().items()
+            if flags not in (pygit2.GIT_STATUS_CURRENT, pygit2.GIT_STATUS_IGNORED)
+        )
+    
+    def push(self):
+        self._cli("push")
+    
+    def _has_commit_hooks(self) -> bool:
+        """Executable commit hooks in core.hooksPath, or .git/hooks by default"""
+        repo = self._open()
+        try:
+            hooks_dir = Path(repo.workdir or repo.path) / os.path.expanduser(repo.config["core.hooksPath"])
+        except KeyError:
+            hooks_dir = Path(repo.path) / "hooks"
+        return any(os.access(hooks_dir / hook, os.X_OK) for hook in self.COMMIT_HOOKS)
+    
+    def _open(self):
+        if self._repo is None:
+            try:
+                self._repo = pygit2.Repository(self.repo_path)
+            except pygit2.GitError as e:
+                raise GitError(str(e)) from e
+        return self._repo
+    
+    def _cli(self, *args: str) -> str:
+        result = subprocess.run(
+            ["git", *args], cwd=self.repo_path, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise GitError(f"git {args[0]}: {result.stderr.strip() or result.stdout.strip()}")
+        return result.stdout
+
+
+def run_git_commit(tasks: list[dict]):
+    """
+    Stage, commit and push a batch of tasks
+    Runs on the git worker thread as one unit so batches never interleave
+    """
+    print(f"  📤 Committing {len(tasks)} task(s)...")
+    
+    # Missing paths would fail the whole add
+    files = [
+        file
+        for file in dict.fromkeys(file for task in tasks for file in task["scope"])
+        if (Path(TARGET_REPO) / file).exists()
+    ]
+    timings = {}
+    
+    def timed(step: str, *args):
+        started = time.perf_counter()
+        getattr(git_worker, step)(*args)
+        timings[step] = (time.perf_counter() - started) * 1000
     
     try:
-        # Stage files
-        for file in task["scope"]:
-            subprocess.run(["git", "add", file], cwd=TARGET_REPO, check=True)
-        
-        # Commit
-        message = f"🤖 Auto: {task['description']}\n\nTask ID: {task['id']}\nType: {task['type']}"
-        subprocess.run(["git", "commit", "-m", message], cwd=TARGET_REPO, check=True)
-        
-        # Push
-        subprocess.run(["git", "push"], cwd=TARGET_REPO, check=True)
-        print("  ✅ Changes pushed!")
-    except subprocess.CalledProcessError as e:
+        timed("add", files)
+        timed("commit", commit_message(tasks))
+        timed("push")
+        
+        summary = ", ".join(f"{step} {ms:.0f} ms" for step, ms in timings.items())
+        print(f"  ✅ Changes pushed! {len(tasks)} task(s), {len(files)} file(s) via {git_worker.backend}: {summary}")
+    except GitError as e:
         print(f"  ❌ Git error: {e}")
 
 
+def is_task_file(path: Path) -> bool:
+    return path.name.startswith("CHANGE-") and path.suffix == ".json"
+
+
+def start_watchdog(tasks_dir: Path, events: queue.Queue) -> "Observer":
+    """
+    Start an inotify (or platform equivalent) observer on the tasks directory
+    Feeds events with the path of every task file that is created or written
+    """
+    def put(path: str):
+        if is_task_file(Path(path)):
+            events.put(Path(path))
+    
+    class TaskEventHandler(FileSystemEventHandler):
+        def on_created(self, event):
+            if not event.is_directory:
+                put(event.src_path)
+        
+        # Non-atomic writers (git pull, in-place writeFileSync) create the
+        # file empty and fill it afterwards; the ledger drops repeats
+        def on_modified(self, event):
+            if not event.is_directory:
+                put(event.src_path)
+        
+        def on_closed(self, event):
+            put(event.src_path)
+        
+        def on_moved(self, event):
+            # Atomic writes land via rename from a temp file
+            if not event.is_directory:
+                put(event.dest_path)
+    
+    observer = Observer()
+    observer.schedule(TaskEventHandler(), str(tasks_dir), recursive=False)
+    observer.start()
+    return observer
+
+
+def watch_with_polling(tasks_dir: Path, retries: queue.Queue) -> Iterator[Path]:
+    """Fallback: re-glob the directory every POLL_INTERVAL seconds"""
+    seen = set()
+    while True:
+        # Files that couldn't be read yet are yielded again
+        while not retries.empty():
+            seen.discard(retries.get_nowait().name)
+        
+        for task_file in tasks_dir.glob("CHANGE-*.json"):
+            if task_file.name not in seen:
+                seen.add(task_file.name)
+                yield task_file
+        time.sleep(POLL_INTERVAL)
+
+
+def iter_task_files(tasks_dir: Path, retries: queue.Queue) -> Iterator[Path]:
+    """
+    Yield existing task files, then new ones as they appear
+    Uses watchdog when installed, otherwise the polling loop. Paths put on
+    retries are yielded again.
+    """
+    use_watchdog = WATCHER_BACKEND == "watchdog" or (WATCHER_BACKEND == "auto" and Observer)
+    if use_watchdog and Observer is None:
+        print("⚠️  watchdog not installed, falling back to polling")
+        use_watchdog = False
+    
+    if not use_watchdog:
+        # The polling loop picks up existing files on its first pass
+        yield from watch_with_polling(tasks_dir, retries)
+        return
+    
+    print("⚡ Using filesystem events (watchdog)")
+    
+    # Start observing before the initial scan so nothing slips in between
+    events = retries
+    observer = start_watchdog(tasks_dir, events)
+    try:
+        for task_file in sorted(tasks_dir.glob("CHANGE-*.json")):
+            yield task_file
+        
+        while True:
+            # Blocks without waking up while the directory is idle
+            path = events.get()
+            if path.exists():
+                yield path
+    finally:
+        observer.stop()
+        observer.join()
+
+
+def restore_pending_reviews():
+    """Re-queue reviews that were still open when the watcher last stopped"""
+    for task_id, task_path in ledger.with_status("awaiting_review"):
+        try:
+            with open(task_path) as f:
+                task = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            # Claimed again, and re-read, if the startup scan still finds it
+            ledger.release(task_id)
+            continue
+        
+        # Finished by hand (or through the extension) while we were away
+        if task.get("status") != "processing":
+            ledger.set_status(task_id, "skipped")
+            continue
+        
+        register_review(task_path, task)
+
+
 def watch_tasks():
     """Main watch loop"""
-    global processed_tasks
+    global ledger, git_worker, commit_batcher
     
     tasks_dir = Path(TASKS_DIR)
     tasks_dir.mkdir(parents=True, exist_ok=True)
     
-    processed_tasks = load_processed_tasks()
+    ledger = TaskLedger(tasks_dir / ".ledger.db")
+    git_worker = GitWorker(TARGET_REPO)
+    commit_batcher = CommitBatcher()
+    restore_pending_reviews()
+    
+    server = start_control_server()
+    workers = ThreadPoolExecutor(max_workers=WATCHER_WORKERS, thread_name_prefix="task")
+    retries = queue.Queue()
+    read_attempts = {}  # task_id -> failed reads so far
+    
+    def prepare_safely(task_file: Path):
+        task_id = task_file.stem.replace("CHANGE-", "")
+        try:
+            prepare_task(task_file)
+            read_attempts.pop(task_id, None)
+        except TaskNotReady as e:
+            # Not an answer about the task: let it be claimed again
+            print(f"⏳ Could not read {e}")
+            ledger.release(task_id)
+            
+            attempts = read_attempts[task_id] = read_attempts.get(task_id, 0) + 1
+            if attempts <= READ_RETRIES:
+                timer = threading.Timer(READ_RETRY_DELAY, retries.put, (task_file,))
+                timer.daemon = True
+                timer.start()
+            else:
+                read_attempts.pop(task_id)
+        except Exception as e:
+            print(f"❌ Error preparing {task_file.name}: {e}")
+            ledger.set_status(task_id, "failed")
     
     print(f"👀 Watching for tasks in: {tasks_dir.absolute()}")
     print(f"📂 Target repo: {Path(TARGET_REPO).absolute()}")
+    print(f"🛂 Review API on http://127.0.0.1:{CONTROL_PORT}/reviews")
     print("Press Ctrl+C to stop\n")
     
-    while True:
-        try:
-            # Find new task files
-            for task_file in tasks_dir.glob("CHANGE-*.json"):
-                task_id = task_file.stem.replace("CHANGE-", "")
-                
-                if task_id not in processed_tasks:
-                    process_task(task_file)
+    try:
+        for task_file in iter_task_files(tasks_dir, retries):
+            task_id = task_file.stem.replace("CHANGE-", "")
             
-            time.sleep(POLL_INTERVAL)
+            if not ledger.claim(task_id, task_file):
+                continue
             
-        except KeyboardInterrupt:
-            print("\n👋 Stopping watcher...")
-            break
-        except Exception as e:
-            print(f"❌ Error: {e}")
-            time.sleep(POLL_INTERVAL)
-
+            workers.submit(prepare_safely, task_file)
+    except KeyboardInterrupt:
+        print("\n👋 Stopping watcher...")
+    finally:
+        server.shutdown()
+        workers.shutdown(wait=False, cancel_futures=True)
+        commit_batcher.flush()
+        git_worker.shutdown()
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "review":
+        review_cli(sys.argv[2:])
+        sys.exit(0)
+    
     # Allow overriding paths via command line
     if len(sys.argv) > 1:
         TASKS_DIR = sys.argv[1]
@@ -0,0 +1,218 @@
+/**
+ * Prompt Templates - Copilot prompts rendered from the shared template spec
+ * The standalone watcher renders the same spec (scripts/prompt_templates.py)
+ */
+
+import * as crypto from 'crypto';
+import defaultSpec from './promptTemplates.json';
+
+// Rendered prompts kept per extension host
+const CACHE_SIZE = 256;
+
+// Task fields a prompt can depend on; the cache key hashes exactly these
+const PROMPT_FIELDS = ['type', 'description', 'scope', 'rules', 'locations'];
+
+export interface PromptLocation {
+    file: string;
+    lines: [number, number];
+}
+
+interface TrimSpec {
+    priority: number;
+    minItems?: number;
+    // Which end of a list loses items first
+    from?: 'start' | 'end';
+    minChars?: number;
+}
+
+interface SectionSpec {
+    id?: string;
+    text?: string;
+    title?: string;
+    lines?: string[];
+    field?: string;
+    list?: string;
+    annotate?: string;
+    trim?: TrimSpec;
+}
+
+export interface TemplateSpec {
+    maxTokens: number;
+    charsPerToken: number;
+    omittedItem: string;
+    sections: SectionSpec[];
+    types: Record<string, Record<string, Partial<SectionSpec>>>;
+}
+
+type CompiledSection = string | SectionSpec;
+
+// Lengths in code points, matching Python's len() so both renderers trim alike
+function charLength(text: string): number {
+    return Array.from(text).length;
+}
+
+function clean(value: unknown): string {
+    return String(value ?? '').replace(/\r\n/g, '\n').trim();
+}
+
+function contentHash(task: Record<string, any>): string {
+    const fields: Record<string, unknown> = {};
+    for (const field of PROMPT_FIELDS) {
+        fields[field] = task[field] ?? null;
+    }
+    return crypto.createHash('sha256').update(JSON.stringify(fields)).digest('hex');
+}
+
+/** Append the pinned line ranges to each file, e.g. "Hero.tsx (lines 4-5)" */
+function annotateLocations(files: string[], locations: PromptLocation[] | undefined): string[] {
+    const ranges = new Map<string, string[]>();
+    for (const location of locations ?? []) {
+        const [start, end] = location.lines;
+        const range = start === end ? `line ${start}` : `lines ${start}-${end}`;
+        ranges.set(location.file, [...(ranges.get(location.file) ?? []), range]);
+    }
+    return files.map(f => ranges.has(f) ? `${f} (${ranges.get(f)!.join(', ')})` : f);
+}
+
+/**
+ * Renders tasks with the template spec. See scripts/prompt_templates.py for
+ * the spec format; both renderers must produce identical output.
+ */
+export class PromptTemplates {
+    readonly maxTokens: number;
+    private compiled = new Map<string, CompiledSection[]>();
+    private cache = new Map<string, string>();
+
+    constructor(private spec: TemplateSpec = defaultSpec as TemplateSpec, maxTokens?: number) {
+        this.maxTokens = maxTokens || spec.maxTokens;
+    }
+
+    estimateTokens(text: string): number {
+        return Math.ceil(charLength(text) / this.spec.charsPerToken);
+    }
+
+    render(task: object): string {
+        const fields = task as Record<string, any>;
+        const key = contentHash(fields);
+        const cached = this.cache.get(key);
+        if (cached !== undefined) {
+            // Re-insert to mark as most recently used
+            this.cache.delete(key);
+            this.cache.set(key, cached);
+            return cached;
+        }
+
+        const prompt = this.renderUncached(fields);
+        this.cache.set(key, prompt);
+        if (this.cache.size > CACHE_SIZE) {
+            this.cache.delete(this.cache.keys().next().value!);
+        }
+        return prompt;
+    }
+
+    /** Literal sections become strings, the rest stay as specs to be filled per task */
+    compile(taskType: string): CompiledSection[] {
+        const existing = this.compiled.get(taskType);
+        if (existing) {
+            return existing;
+        }
+
+        const overrides = this.spec.types[taskType] ?? {};
+        const compiled = this.spec.sections.map((base): CompiledSection => {
+            const section = { ...base, ...(base.id ? overrides[base.id] : undefined) };
+            if (section.text !== undefined) {
+                return section.text;
+            }
+            if (section.lines !== undefined) {
+                return `## ${section.title}\n` + section.lines.join('\n');
+            }
+            return section;
+        });
+
+        this.compiled.set(taskType, compiled);
+        return compiled;
+    }
+
+    private renderUncached(task: Record<string, any>): string {
+        const sections = this.compile(task.type ?? '');
+        const fields: Record<string, string> = {};
+        const lists: Record<string, string[]> = {};
+        for (const section of sections) {
+            if (typeof section === 'string') {
+                continue;
+            }
+            if (section.field) {
+                fields[section.field] = clean(task[section.field]);
+            } else if (section.list) {
+                const items = ((task[section.list] ?? []) as unknown[]).map(clean).filter(item => item);
+                lists[section.list] = [...new Set(items)];
+            }
+        }
+        const omitted: Record<string, number> = {};
+
+        let prompt = this.assemble(sections, task, fields, lists, omitted);
+        if (this.estimateTokens(prompt) <= this.maxTokens) {
+            return prompt;
+        }
+
+        const trimmable = sections
+            .filter((s): s is SectionSpec => typeof s !== 'string' && s.trim !== undefined)
+            .sort((a, b) => a.trim!.priority - b.trim!.priority);
+
+        for (const section of trimmable) {
+            if (section.list) {
+                const items = lists[section.list];
+                while (items.length > (section.trim!.minItems ?? 0) && this.estimateTokens(prompt) > this.maxTokens) {
+                    if (section.trim!.from === 'start') {
+                        items.shift();
+                    } else {
+                        items.pop();
+                    }
+                    omitted[section.list] = (omitted[section.list] ?? 0) + 1;
+                    prompt = this.assemble(sections, task, fields, lists, omitted);
+                }
+            } else if (section.field) {
+                const value = Array.from(fields[section.field]);
+                const overflow = charLength(prompt) - this.maxTokens * this.spec.charsPerToken;
+                const keep = Math.max(section.trim!.minChars ?? 0, value.length - overflow - 1);
+                if (overflow > 0 && keep < value.length) {
+                    fields[section.field] = value.slice(0, keep).join('').trimEnd() + '…';
+                    prompt = this.assemble(sections, task, fields, lists, omitted);
+                }
+            }
+
+            if (this.estimateTokens(prompt) <= this.maxTokens) {
+                break;
+            }
+        }
+
+        return prompt;
+    }
+
+    private assemble(
+        sections: CompiledSection[],
+        task: Record<string, any>,
+        fields: Record<string, string>,
+        lists: Record<string, string[]>,
+        omitted: Record<string, number>
+    ): string {
+        return sections.map(section => {
+            if (typeof section === 'string') {
+                return section;
+            }
+            if (section.field) {
+                return `## ${section.title}\n${fields[section.field]}`;
+            }
+
+            let items = lists[section.list!];
+            if (section.annotate) {
+                items = annotateLocations(items, task[section.annotate]);
+            }
+            const lines = items.map(item => `- ${item}`);
+            if (omitted[section.list!]) {
+                lines.push(this.spec.omittedItem.replace('{count}', String(omitted[section.list!])));
+            }
+            return `## ${section.title}\n` + lines.join('\n');
+        }).join('\n\n');
+    }
+}
@@ -6,6 +6,7 @@ import * as vscode from 'vscode';
 import * as fs from 'fs';
 import * as path from 'path';
 import { GitManager } from './gitManager';
+import { PromptLocation, PromptTemplates } from './promptTemplates';
 
 export interface Task {
     id: string;
@@ -16,6 +17,7 @@ export interface Task {
     auto_commit: boolean;
     status: string;
     created_at: string;
+    locations?: PromptLocation[];
     source?: {
         message: string;
         sender: string;
@@ -31,6 +33,8 @@ export interface Task {
 export class TaskProcessor {
     private gitManager: GitManager;
     private context: vscode.ExtensionContext;
+    private promptTemplates?: PromptTemplates;
+    private promptMaxTokens = 0;
 
     constructor(gitManager: GitManager, context: vscode.ExtensionContext) {
         this.gitManager = gitManager;
@@ -169,31 +173,13 @@ export class TaskProcessor {
     }
 
     private buildCopilotPrompt(task: Task): string {
-        const scopeList = task.scope.map(f => `- ${f}`).join('\n');
-        const rulesList = task.rules.map(r => `- ${r}`).join('\n');
-
-        return `Apply the following change strictly:
-
-## Task Type
-${task.type}
-
-## Description
-${task.description}
-
-## Target Files (ONLY modify these)
-${scopeList}
-
-## Rules (MUST follow)
-${rulesList}
-
-## Important
-- Make ONLY the requested change
-- Do NOT modify any other code
-- Do NOT change layout or structure unless explicitly requested
-- Preserve all existing functionality
-- Keep the same code style and formatting
-
-Please apply this change now.`;
+        const config = vscode.workspace.getConfiguration('whatsappAutomation');
+        const maxTokens = config.get<number>('promptMaxTokens', 0);
+        if (!this.promptTemplates || maxTokens !== this.promptMaxTokens) {
+            this.promptTemplates = new PromptTemplates(undefined, maxTokens);
+            this.promptMaxTokens = maxTokens;
+        }
+        return this.promptTemplates.render(task);
     }
 
     private canAutoCommit(task: Task): boolean {